@@ -3,19 +3,40 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import csv
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from scripts.helpers import log_message
 import concurrent.futures
 import argparse
 
+# Optional faster JSON decoder for page responses (falls back to requests' json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # --- CONFIGURATION ---
 TEST_MODE = False
 MAX_PURCHASE_PAGES = None
-MAX_WORKERS = 1  # Reduced to 1 to avoid rate limiting
+# Stores fetched in parallel. Defaults to 1 to avoid rate limiting; raise via
+# RICS_STORE_WORKERS if the token's rate limit allows (each store also has one
+# page prefetch in flight, so requests in flight are up to 2x this)
+MAX_WORKERS = max(1, min(int(os.getenv("RICS_STORE_WORKERS", "1")), 8))
 DEBUG_MODE = False
 
 ABSOLUTE_TIMEOUT_SECONDS = 120
 
+# Adaptive page size (Take). Pages start at PAGE_SIZE; after a full page that
+# came back quickly the next page doubles (up to RICS_MAX_PAGE_SIZE), and a
+# slow page halves it (down to MIN_PAGE_SIZE). The ceiling defaults to the
+# long-standing 100 until larger pages are confirmed against the RICS API.
+PAGE_SIZE = 100
+MIN_PAGE_SIZE = 25
+MAX_PAGE_SIZE = max(PAGE_SIZE, int(os.getenv("RICS_MAX_PAGE_SIZE", "100")))
+FAST_PAGE_SECONDS = 2
+SLOW_PAGE_SECONDS = 5
+
 # Configurable lookback days via environment variable
 # Default to 1 day for daily syncs, but can be set to 45 for initial catch-up sync
 RICS_LOOKBACK_DAYS = int(os.getenv("RICS_LOOKBACK_DAYS", "1"))
@@ -29,9 +50,36 @@ purchase_history_fields = [
     "AccountNumber", "CustomerId", "CustomerName", "CustomerEmail", "CustomerPhone",
     "Sku", "Description", "Quantity", "AmountPaid", "Discount", "Department", "SupplierName"
 ]
+# Rows are stored as plain tuples in purchase_history_fields order (far smaller
+# than a dict per row, and written to the CSV as-is); these index into them
+TICKET_DATETIME_IDX = purchase_history_fields.index("TicketDateTime")
+TICKET_NUMBER_IDX = purchase_history_fields.index("TicketNumber")
+SALE_DATETIME_IDX = purchase_history_fields.index("SaleDateTime")
 
 DEDUP_LOG_PATH = os.path.join("logs", "sent_ticket_ids.csv")
 
+# Keep-alive session shared by all store/page requests so each page after the
+# first reuses an open TLS connection instead of handshaking again.
+# Sized for the store workers plus one prefetch thread each. Rate limits (429)
+# and transient 5xx responses are retried inside the adapter with exponential
+# backoff (1s, 2s, 4s, ... ~30s in total), honoring Retry-After when RICS sends
+# it. GetPOSTransaction is a read, so retrying the POST is safe.
+_RETRY_SETTINGS = dict(
+    total=5,
+    backoff_factor=1,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"POST"}),
+    raise_on_status=False,
+)
+try:
+    # Jitter spreads retries from parallel store workers (urllib3 >= 2)
+    _RETRY = Retry(backoff_jitter=0.5, **_RETRY_SETTINGS)
+except TypeError:
+    _RETRY = Retry(**_RETRY_SETTINGS)
+
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=_RETRY))
+
 
 def parse_dt(dt_str):
     if not dt_str:
@@ -102,11 +150,16 @@ def fetch_pos_transactions_for_store(store_code=None,
         debug_mode: Enable debug logging
         already_sent: Set of ticket IDs already processed (for deduplication)
         lookback_days: Number of days to look back (defaults to RICS_LOOKBACK_DAYS env var or 1)
+
+    Returns:
+        List of row tuples ordered as purchase_history_fields
     """
     start_time = datetime.utcnow()
     all_rows = []
     seen_keys = set()
-    page_count, api_calls, skip, take = 0, 0, 0, 100
+    # Date range of collected rows, tracked from the already parsed sale dates
+    oldest_date = newest_date = None
+    page_count, api_calls, skip, take = 0, 0, 0, PAGE_SIZE
 
     # Use provided lookback_days or fall back to global config
     if lookback_days is None:
@@ -135,7 +188,59 @@ def fetch_pos_transactions_for_store(store_code=None,
     log_message(f"🔍 DEBUG: Using both BatchStartDate/BatchEndDate (date-only) AND TicketDateStart/TicketDateEnd (ISO 8601)")
     log_message(f"🔍 DEBUG: Current year: {datetime.utcnow().year}")
 
-    while True:
+    token = os.getenv("RICS_API_TOKEN")
+    if not token:
+        log_message(f"❌ RICS_API_TOKEN not found for Store {store_code}")
+
+    def request_page(page_skip, page_take, page_number, delay):
+        """Request one page of POS transactions (retries happen in SESSION).
+
+        Args:
+            page_skip: Skip offset for the page
+            page_take: Take (page size) for the page
+            page_number: 1-based page number (for logging)
+            delay: Seconds to wait before the request (rate limit spacing)
+
+        Returns:
+            Tuple of (response, api_calls_made, response_seconds)
+        """
+        if delay:
+            time.sleep(delay)
+        # Use both BatchStartDate/BatchEndDate AND TicketDateStart/TicketDateEnd
+        # Try date-only format for Batch dates, ISO 8601 with time for Ticket dates
+        payload = {
+            "Take": page_take,
+            "Skip": page_skip,
+            "BatchStartDate": start_date_only,  # Date-only format
+            "BatchEndDate": end_date_only,        # Date-only format
+            "TicketDateStart": start_date,        # ISO 8601 with time
+            "TicketDateEnd": end_date,            # ISO 8601 with time
+            "StoreCode": str(store_code)
+        }
+        log_message(f"📤 Fetching POS transactions for Store {store_code}, "
+                    f"page {page_number}")
+        request_start = time.monotonic()
+        resp = SESSION.post(
+            "https://enterprise.ricssoftware.com/api/POS/GetPOSTransaction",
+            headers={"Token": token},
+            json=payload,
+            timeout=30  # Reduced from 120 to 30 seconds per API call
+        )
+        # Count the adapter's retried attempts as API calls too
+        retries = getattr(getattr(resp, "raw", None), "retries", None)
+        calls = 1 + (len(retries.history) if retries is not None else 0)
+        if calls > 1:
+            log_message(f"⚠️ Store {store_code} page {page_number}: needed {calls - 1} "
+                        f"retries (rate limit / server errors)")
+        return resp, calls, time.monotonic() - request_start
+
+    # One page is always in flight while the previous one is parsed, so the
+    # network round trip (and the spacing delay) overlaps row construction.
+    # A single worker keeps at most one request outstanding per store.
+    prefetch = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    next_page = prefetch.submit(request_page, skip, take, 1, 0) if token else None
+
+    while next_page is not None:
         # Safety check: prevent infinite loops (check at start of each iteration)
         if page_count > 50:  # Max 50 pages per store
             log_message(f"⏰ Store {store_code}: Hit max pages limit ({page_count})")
@@ -146,35 +251,10 @@ def fetch_pos_transactions_for_store(store_code=None,
             log_message(f"⏰ Store {store_code}: Hit 5-minute timeout")
             break
             
-        # Use both BatchStartDate/BatchEndDate AND TicketDateStart/TicketDateEnd
-        # Try date-only format for Batch dates, ISO 8601 with time for Ticket dates
-        payload = {
-            "Take": take,
-            "Skip": skip,
-            "BatchStartDate": start_date_only,  # Date-only format
-            "BatchEndDate": end_date_only,        # Date-only format
-            "TicketDateStart": start_date,        # ISO 8601 with time
-            "TicketDateEnd": end_date,            # ISO 8601 with time
-            "StoreCode": str(store_code)
-        }
-
         try:
-            log_message(f"📤 Fetching POS transactions for Store {store_code}, "
-                        f"page {page_count+1}")
-            
-            # Check if token is available
-            token = os.getenv("RICS_API_TOKEN")
-            if not token:
-                log_message(f"❌ RICS_API_TOKEN not found for Store {store_code}")
-                break
-                
-            resp = requests.post(
-                "https://enterprise.ricssoftware.com/api/POS/GetPOSTransaction",
-                headers={"Token": token},
-                json=payload,
-                timeout=30  # Reduced from 120 to 30 seconds per API call
-            )
-            api_calls += 1
+            resp, calls, response_seconds = next_page.result()
+            next_page = None
+            api_calls += calls
             
             log_message(f"📊 Store {store_code} API response: {resp.status_code}")
             
@@ -182,19 +262,35 @@ def fetch_pos_transactions_for_store(store_code=None,
                 log_message(f"❌ 401 Unauthorized for Store {store_code} - token may be invalid or expired")
                 break
             elif resp.status_code == 429:
-                log_message(f"⚠️ Rate limited for Store {store_code} - waiting 30 seconds before retry")
-                import time
-                time.sleep(30)  # Wait 30 seconds for rate limit to reset
-                continue  # Retry the same request
+                log_message(f"❌ Store {store_code} still rate limited after retries - stopping pagination")
+                break
             elif resp.status_code != 200:
                 log_message(f"❌ API error {resp.status_code} for Store {store_code}: {resp.text[:200]}")
                 break
                 
             resp.raise_for_status()
-            data = resp.json()
+            # orjson decodes the raw bytes directly (no str decode first)
+            data = orjson.loads(resp.content) if orjson is not None else resp.json()
 
             sales = data.get("Sales", [])
             log_message(f"📊 Store {store_code} returned {len(sales)} sales")
+
+            # Size the next page from this one: grow after a fast full page,
+            # shrink after a slow one
+            next_take = take
+            if response_seconds > SLOW_PAGE_SECONDS:
+                next_take = max(take // 2, MIN_PAGE_SIZE)
+            elif response_seconds < FAST_PAGE_SECONDS and len(sales) >= take:
+                next_take = min(take * 2, MAX_PAGE_SIZE)
+            if next_take != take:
+                log_message(f"📐 Store {store_code}: page took {response_seconds:.1f}s, "
+                            f"Take {take} → {next_take}")
+
+            # Start the next page now; the 2 second delay between API calls
+            # runs in the prefetch worker instead of blocking this thread
+            if (sales and not debug_mode and page_count + 1 <= 50
+                    and not (max_purchase_pages and page_count + 1 >= max_purchase_pages)):
+                next_page = prefetch.submit(request_page, skip + take, next_take, page_count + 2, 2)
             
             # Check what date range is actually in this page of results
             if sales and page_count == 0:
@@ -231,10 +327,6 @@ def fetch_pos_transactions_for_store(store_code=None,
             if not sales and page_count < 3:
                 log_message(f"🔍 Debug - Store {store_code} page {page_count+1}: No sales in response")
             
-            # Add delay to avoid rate limiting
-            import time
-            time.sleep(2)  # 2 second delay between API calls
-            
             if not sales:
                 log_message(f"⚠️ No more Sales returned for Store {store_code}.")
                 break
@@ -277,6 +369,11 @@ def fetch_pos_transactions_for_store(store_code=None,
                 
                 # Process each sale header (individual transaction)
                 for sale_header in sale_headers:
+                    ticket_number = str(sale_header.get("TicketNumber", ""))
+                    # Already-sent tickets are skipped before any parsing or row building
+                    if already_sent and ticket_number in already_sent:
+                        continue
+
                     sale_dt = parse_dt(sale_header.get("TicketDateTime") or sale_header.get("SaleDateTime"))
                     
                     # REMOVED: Post-fetch date filtering
@@ -295,6 +392,8 @@ def fetch_pos_transactions_for_store(store_code=None,
                         log_message(f"🔍 Raw TicketDateTime: {sale_header.get('TicketDateTime')}")
                         log_message(f"🔍 Raw SaleDateTime: {sale_header.get('SaleDateTime')}")
 
+                    rows_before = len(all_rows)
+
                     # Get customer info if available
                     customer_info = sale_header.get("Customer", {})
                     
@@ -302,19 +401,21 @@ def fetch_pos_transactions_for_store(store_code=None,
                     if len(all_rows) < 3:
                         log_message(f"🔍 DEBUG: Customer data: {customer_info}")
                     
-                    sale_info = {
-                        "TicketDateTime": sale_header.get("TicketDateTime"),
-                        "TicketNumber": str(sale_header.get("TicketNumber", "")),
-                        "SaleDateTime": sale_header.get("SaleDateTime"),
-                        "StoreCode": sale.get("StoreCode"),
-                        "TerminalId": sale_header.get("TerminalId"),
-                        "Cashier": sale_header.get("CashierName"),
-                        "AccountNumber": customer_info.get("AccountNumber"),
-                        "CustomerId": customer_info.get("CustomerId"),
-                        "CustomerName": customer_info.get("FirstName", "") + " " + customer_info.get("LastName", ""),
-                        "CustomerEmail": customer_info.get("Email"),
-                        "CustomerPhone": customer_info.get("Phone"),
-                    }
+                    # Sale-level columns shared by every row of this sale
+                    # (TicketDateTime through CustomerPhone)
+                    sale_info = (
+                        sale_header.get("TicketDateTime"),
+                        ticket_number,
+                        sale_header.get("SaleDateTime"),
+                        sale.get("StoreCode"),
+                        sale_header.get("TerminalId"),
+                        sale_header.get("CashierName"),
+                        customer_info.get("AccountNumber"),
+                        customer_info.get("CustomerId"),
+                        customer_info.get("FirstName", "") + " " + customer_info.get("LastName", ""),
+                        customer_info.get("Email"),
+                        customer_info.get("Phone"),
+                    )
 
                     # Check if there are SaleDetails (items) for this sale
                     sale_details = sale_header.get("SaleDetails", [])
@@ -328,44 +429,44 @@ def fetch_pos_transactions_for_store(store_code=None,
                     if sale_details:
                         # Process each item in the sale
                         for item in sale_details:
-                            key = f"{sale_info['TicketNumber']}_{item.get('Sku')}"
-                            if already_sent and sale_info['TicketNumber'] in already_sent:
-                                continue
+                            sku = item.get("Sku")
+                            key = f"{ticket_number}_{sku}"
                             if key in seen_keys:
                                 continue
 
                             seen_keys.add(key)
-                            row = {
-                                **sale_info,
-                                "Sku": item.get("Sku"),
-                                "Description": item.get("Summary") or item.get("TransactionSaleDescription"),
-                                "Quantity": item.get("Quantity"),
-                                "AmountPaid": item.get("AmountPaid"),
-                                "Discount": item.get("PerkAmount", 0),
-                                "Department": item.get("ProductItem", {}).get("Classes", [{}])[0].get("TagTree", ""),
-                                "SupplierName": item.get("ProductItem", {}).get("Supplier"),
-                            }
-                            all_rows.append(row)
+                            product_item = item.get("ProductItem", {})
+                            all_rows.append(sale_info + (
+                                sku,
+                                item.get("Summary") or item.get("TransactionSaleDescription"),
+                                item.get("Quantity"),
+                                item.get("AmountPaid"),
+                                item.get("PerkAmount", 0),
+                                product_item.get("Classes", [{}])[0].get("TagTree", ""),
+                                product_item.get("Supplier"),
+                            ))
                     else:
                         # No SaleLines - add the sale header as a single row
-                        key = f"{sale_info['TicketNumber']}_no_items"
-                        if already_sent and sale_info['TicketNumber'] in already_sent:
-                            continue
+                        key = f"{ticket_number}_no_items"
                         if key in seen_keys:
                             continue
 
                         seen_keys.add(key)
-                        row = {
-                            **sale_info,
-                            "Sku": "",
-                            "Description": "Sale (no items)",
-                            "Quantity": 1,
-                            "AmountPaid": sale_header.get("TotalAmount", 0),
-                            "Discount": 0,
-                            "Department": "",
-                            "SupplierName": "",
-                        }
-                        all_rows.append(row)
+                        all_rows.append(sale_info + (
+                            "",                                  # Sku
+                            "Sale (no items)",                   # Description
+                            1,                                   # Quantity
+                            sale_header.get("TotalAmount", 0),   # AmountPaid
+                            0,                                   # Discount
+                            "",                                  # Department
+                            "",                                  # SupplierName
+                        ))
+
+                    if len(all_rows) > rows_before:
+                        if oldest_date is None or sale_dt < oldest_date:
+                            oldest_date = sale_dt
+                        if newest_date is None or sale_dt > newest_date:
+                            newest_date = sale_dt
 
             page_count += 1
             
@@ -378,6 +479,7 @@ def fetch_pos_transactions_for_store(store_code=None,
                 break
                 
             skip += take
+            take = next_take
             if debug_mode:
                 break
 
@@ -385,17 +487,12 @@ def fetch_pos_transactions_for_store(store_code=None,
             log_message(f"❌ Error fetching POS transactions for Store {store_code}: {e}")
             break
 
-    # Find the most recent and oldest dates in the collected rows
+    # Drop any page still in flight after an early stop
+    prefetch.shutdown(wait=False, cancel_futures=True)
+
+    # Report the most recent and oldest dates in the collected rows
     if all_rows:
-        dates = []
-        for row in all_rows:
-            dt = parse_dt(row.get("TicketDateTime") or row.get("SaleDateTime"))
-            if dt:
-                dates.append(dt)
-        
-        if dates:
-            oldest_date = min(dates)
-            newest_date = max(dates)
+        if newest_date is not None:
             log_message(f"📦 Store {store_code}: Collected {len(all_rows)} new rows "
                        f"({page_count} pages, {api_calls} calls)")
             log_message(f"📅 Store {store_code}: Date range in data - Oldest: {oldest_date}, Newest: {newest_date}")
@@ -452,12 +549,22 @@ def fetch_rics_data_with_purchase_history(max_purchase_pages=None, debug_mode=Fa
         already_sent = load_sent_ticket_ids()
         log_message(f"📂 Loaded {len(already_sent)} previously sent TicketNumbers")
 
-    all_rows = []
     STORE_CODES = [1, 2, 3, 4, 6, 7, 8, 9, 10, 11, 12, 21, 22, 98, 99]
     
     log_message(f"🏪 Processing {len(STORE_CODES)} stores: {STORE_CODES}")
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    # Each store's rows are written to the CSV as soon as that store finishes,
+    # so rows are never gathered into one list for a separate write pass; only
+    # the counts, ticket IDs and date range needed afterwards are kept
+    total_rows = 0
+    first_row = None
+    new_ticket_ids = set()
+    oldest_date = newest_date = None
+
+    with open(output_path, "w", newline="") as file, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        writer = csv.writer(file)
+        writer.writerow(purchase_history_fields)
         futures = {
             executor.submit(
                 fetch_pos_transactions_for_store,
@@ -479,7 +586,19 @@ def fetch_rics_data_with_purchase_history(max_purchase_pages=None, debug_mode=Fa
                     
                 store_code = futures[future]
                 rows = future.result()
-                all_rows.extend(rows)
+                writer.writerows(rows)
+                total_rows += len(rows)
+                if first_row is None and rows:
+                    first_row = rows[0]
+                for row in rows:
+                    if row[TICKET_NUMBER_IDX]:
+                        new_ticket_ids.add(str(row[TICKET_NUMBER_IDX]))
+                    dt = parse_dt(row[TICKET_DATETIME_IDX] or row[SALE_DATETIME_IDX])
+                    if dt:
+                        if oldest_date is None or dt < oldest_date:
+                            oldest_date = dt
+                        if newest_date is None or dt > newest_date:
+                            newest_date = dt
                 store_results[store_code] = len(rows)
                 log_message(f"✅ Store {store_code}: Fetched {len(rows)} rows")
             except Exception as exc:
@@ -494,17 +613,9 @@ def fetch_rics_data_with_purchase_history(max_purchase_pages=None, debug_mode=Fa
             status = "✅" if row_count > 0 else "⚠️"
             log_message(f"   {status} Store {store_code}: {row_count} rows")
         
-        # Find overall date range across all stores
-        if all_rows:
-            dates = []
-            for row in all_rows:
-                dt = parse_dt(row.get("TicketDateTime") or row.get("SaleDateTime"))
-                if dt:
-                    dates.append(dt)
-            
-            if dates:
-                oldest_date = min(dates)
-                newest_date = max(dates)
+        # Overall date range across all stores
+        if total_rows:
+            if newest_date is not None:
                 days_old = (datetime.utcnow() - newest_date).days
                 log_message(f"\n📅 Overall Data Date Range:")
                 log_message(f"   Oldest sale: {oldest_date}")
@@ -514,38 +625,35 @@ def fetch_rics_data_with_purchase_history(max_purchase_pages=None, debug_mode=Fa
                     log_message(f"   ⚠️  WARNING: RICS API appears to have a {days_old}-day delay in data availability!")
                     log_message(f"   This is likely an API limitation, not a code issue.")
 
-    # Debug: Log sample data before writing CSV
-    if all_rows:
-        log_message(f"🔍 DEBUG: Sample row data: {all_rows[0]}")
-        log_message(f"🔍 DEBUG: Total rows to write: {len(all_rows)}")
+    # Debug: Log sample data from the CSV
+    if total_rows:
+        log_message(f"🔍 DEBUG: Sample row data: {dict(zip(purchase_history_fields, first_row))}")
+        log_message(f"🔍 DEBUG: Total rows written: {total_rows}")
     else:
         log_message(f"⚠️ WARNING: No rows to write to CSV!")
 
-    with open(output_path, "w", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=purchase_history_fields)
-        writer.writeheader()
-        writer.writerows(all_rows)
-
-    log_message(f"📝 Wrote {len(all_rows)} rows to {output_path}")
+    log_message(f"📝 Wrote {total_rows} rows to {output_path}")
     
     # Debug: Check if file was actually created and has content
     if os.path.exists(output_path):
         file_size = os.path.getsize(output_path)
         log_message(f"🔍 DEBUG: CSV file size: {file_size} bytes")
         if file_size > 0:
+            # Stream the file for the line count rather than loading it all
             with open(output_path, 'r') as f:
-                lines = f.readlines()
-                log_message(f"🔍 DEBUG: CSV has {len(lines)} lines")
-                if len(lines) > 1:  # More than just header
-                    log_message(f"🔍 DEBUG: First data line: {lines[1].strip()}")
+                next(f, None)  # Header
+                first_line = next(f, None)
+                line_count = 1 + (first_line is not None) + sum(1 for _ in f)
+            log_message(f"🔍 DEBUG: CSV has {line_count} lines")
+            if first_line is not None:  # More than just header
+                log_message(f"🔍 DEBUG: First data line: {first_line.strip()}")
     else:
         log_message(f"❌ ERROR: CSV file was not created!")
 
     if no_dedup:
         log_message("🔧 No-dedup mode: Skipping deduplication tracking")
-        summary = f"{len(all_rows)} total rows (no dedup)"
+        summary = f"{total_rows} total rows (no dedup)"
     else:
-        new_ticket_ids = {str(row["TicketNumber"]) for row in all_rows if row["TicketNumber"]}
         skipped_count = len([tid for tid in already_sent if tid not in new_ticket_ids])
 
         if new_ticket_ids:
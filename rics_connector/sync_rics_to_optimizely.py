@@ -29,8 +29,9 @@ import sys
 import json
 import csv
 import hashlib
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 # Add parent directory to path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -67,6 +68,24 @@ PROCESSED_EVENTS_LOG = os.path.join(os.path.dirname(__file__), "..", "logs", "pr
 # Batch configuration
 EVENT_BATCH_SIZE = 100  # Batch events for efficiency
 
+# Event batches are posted on background threads so CSV processing is not blocked on the network
+EVENT_POST_WORKERS = max(1, int(os.getenv("RICS_POST_WORKERS", "4")))
+MAX_PENDING_POSTS = EVENT_POST_WORKERS * 2  # Backpressure: wait once this many batches are in flight
+
+# Purchase event property -> CSV column (in payload order); empty values are omitted
+EVENT_PROP_COLUMNS = (
+    ("store_code", "StoreCode"),
+    ("terminal_id", "TerminalId"),
+    ("cashier", "Cashier"),
+    ("sku", "Sku"),
+    ("description", "Description"),
+    ("quantity", "Quantity"),
+    ("amount_paid", "AmountPaid"),  # Keep original string value
+    ("discount", "Discount"),
+    ("department", "Department"),
+    ("supplier_name", "SupplierName"),
+)
+
 
 def _normalize_email(email: str) -> Optional[str]:
     """Normalize email address."""
@@ -178,6 +197,58 @@ def _parse_timestamp(ts_str: str) -> Optional[str]:
     return None
 
 
+def _post_event_batch(event_batch: List[Dict], event_keys: List[str], label: str, verbose: bool) -> Tuple[int, List[str]]:
+    """
+    Post a batch of purchase events to Optimizely (runs on a worker thread).
+    
+    Args:
+        event_batch: List of event payloads
+        event_keys: Deduplication keys for the events in the batch
+        label: Batch label for logging ("" or "final ")
+        verbose: Whether to log a successful post
+    
+    Returns:
+        Tuple of (posted_events, event_keys to mark as processed); keys are only
+        returned after a successful API response (200/202) so failed events are
+        retried next run
+    """
+    try:
+        status_code, response_text = post_events_batch(event_batch)
+    except Exception as e:
+        print(f"❌ Error posting {label}event batch: {e}")
+        print(f"   ⚠️ NOT marking events as processed (will retry next run)")
+        return 0, []
+    
+    if status_code in (200, 202):
+        if verbose:
+            print(f"   ✅ Posted {label}batch of {len(event_batch)} events (status: {status_code})")
+        return len(event_batch), event_keys
+    
+    print(f"⚠️ {label.capitalize()}Event batch post failed: {status_code} - {response_text[:200]}")
+    print(f"   ⚠️ NOT marking {len(event_batch)} events as processed (will retry next run)")
+    return 0, []
+
+
+def _wait_for_posts(pending_posts: List[Future], new_event_keys: Set[str], max_pending: int = 0) -> int:
+    """
+    Wait for in-flight event batch posts (oldest first) until at most max_pending remain.
+    
+    Args:
+        pending_posts: List of _post_event_batch futures; completed entries are removed
+        new_event_keys: Set to add the keys of successfully posted events to
+        max_pending: Number of posts allowed to stay in flight
+    
+    Returns:
+        Number of events posted by the batches that completed
+    """
+    posted = 0
+    while len(pending_posts) > max_pending:
+        count, keys = pending_posts.pop(0).result()
+        posted += count
+        new_event_keys.update(keys)
+    return posted
+
+
 def process_rics_purchases(csv_path: str):
     """
     Main processing function: read RICS purchase CSV and sync to Optimizely.
@@ -250,6 +321,8 @@ def process_rics_purchases(csv_path: str):
     # Batch event collection
     event_batch = []
     event_batch_keys = []  # Track event keys for each batch (for deduplication after successful post)
+    post_executor = ThreadPoolExecutor(max_workers=EVENT_POST_WORKERS)
+    pending_posts = []  # In-flight _post_event_batch futures
     
     # TEST MODE validation
     if RICS_TEST_MODE:
@@ -295,8 +368,8 @@ def process_rics_purchases(csv_path: str):
             try:
                 # Extract customer info
                 original_email = _normalize_email(row.get("CustomerEmail", ""))
-                phone = row.get("CustomerPhone", "").strip()
-                customer_name = row.get("CustomerName", "").strip()
+                phone = (row.get("CustomerPhone") or "").strip()
+                customer_name = (row.get("CustomerName") or "").strip()
                 
                 # TEST MODE: Filter by email if specified (more reliable than name)
                 if RICS_TEST_MODE and RICS_TEST_EMAIL_FILTER:
@@ -336,64 +409,54 @@ def process_rics_purchases(csv_path: str):
                     continue
                 
                 # Extract purchase info
-                ticket_number = str(row.get("TicketNumber", "")).strip()
-                ticket_datetime = row.get("TicketDateTime", "")
-                purchase_ts = _parse_timestamp(ticket_datetime)
+                # Skip if no ticket_number - can't create purchase without order_id
+                ticket_number = str(row.get("TicketNumber") or "").strip()
+                if not ticket_number:
+                    skipped_rows += 1
+                    skip_reasons["missing_ticket_number"] += 1
+                    continue
                 
-                # Build profile attributes
-                profile_attrs = {
-                    "first_name": row.get("CustomerName", "").split()[0] if row.get("CustomerName") else "",
-                    "last_name": " ".join(row.get("CustomerName", "").split()[1:]) if row.get("CustomerName") and len(row.get("CustomerName", "").split()) > 1 else "",
-                    "rics_customer_id": row.get("CustomerId", "").strip(),
-                    "rics_account_number": row.get("AccountNumber", "").strip(),
-                }
+                purchase_ts = _parse_timestamp(row.get("TicketDateTime", ""))
+                
+                # Build profile attributes, adding only non-empty values
+                profile_attrs = {}
+                name_parts = customer_name.split()
+                if name_parts:
+                    profile_attrs["first_name"] = name_parts[0]
+                    if len(name_parts) > 1:
+                        profile_attrs["last_name"] = " ".join(name_parts[1:])
+                customer_id = (row.get("CustomerId") or "").strip()
+                if customer_id:
+                    profile_attrs["rics_customer_id"] = customer_id
+                account_number = (row.get("AccountNumber") or "").strip()
+                if account_number:
+                    profile_attrs["rics_account_number"] = account_number
                 
                 # Add phone if available
                 if phone:
                     profile_attrs["phone_number"] = phone
                 
-                # Remove empty values
-                profile_attrs = {k: v for k, v in profile_attrs.items() if v}
+                # Build purchase event properties, adding only non-empty values
+                event_props = {"ticket_number": ticket_number}
+                for prop, column in EVENT_PROP_COLUMNS:
+                    value = (row.get(column) or "").strip()
+                    if value:
+                        event_props[prop] = value
                 
-                # Build purchase event properties
                 # Include order_id and value for Optimizely to recognize as purchase event
-                amount_paid_str = row.get("AmountPaid", "").strip()
+                amount_paid_str = event_props.get("amount_paid", "")
                 try:
                     amount_paid_float = float(amount_paid_str) if amount_paid_str else 0.0
                 except (ValueError, TypeError):
                     amount_paid_float = 0.0
                 
-                event_props = {
-                    "ticket_number": ticket_number,
-                    "store_code": row.get("StoreCode", "").strip(),
-                    "terminal_id": row.get("TerminalId", "").strip(),
-                    "cashier": row.get("Cashier", "").strip(),
-                    "sku": row.get("Sku", "").strip(),
-                    "description": row.get("Description", "").strip(),
-                    "quantity": row.get("Quantity", "").strip(),
-                    "amount_paid": amount_paid_str,  # Keep original string value
-                    "discount": row.get("Discount", "").strip(),
-                    "department": row.get("Department", "").strip(),
-                    "supplier_name": row.get("SupplierName", "").strip(),
+                # Order object is required for purchase recognition
+                event_props["order"] = {
+                    "order_id": ticket_number,  # required
+                    "value": amount_paid_float,
+                    "currency": "USD"
                 }
                 
-                # Add order object only if ticket_number is present (required for purchase recognition)
-                ticket_number_str = str(ticket_number).strip() if ticket_number else ""
-                if ticket_number_str:
-                    event_props["order"] = {
-                        "order_id": ticket_number_str,  # required
-                        "value": amount_paid_float,
-                        "currency": "USD"
-                    }
-                else:
-                    # Skip if no ticket_number - can't create purchase without order_id
-                    skipped_rows += 1
-                    skip_reasons["missing_ticket_number"] += 1
-                    continue
-
-                # Remove empty values (but keep order object intact)
-                event_props = {k: v for k, v in event_props.items() if v or v == 0}
-                
                 valid_rows += 1
                 rows_processed += 1
                 
@@ -472,32 +535,18 @@ def process_rics_purchases(csv_path: str):
                 event_batch.append(event_payload)
                 event_batch_keys.append(event_key)  # Track keys for deduplication (only mark as processed after successful post)
                 
-                # Post batch when it reaches the batch size
+                # ⚡ OPTIMIZATION: Post batch on a worker thread when it reaches the batch size
+                # (keys are only marked as processed after a successful API response)
                 if len(event_batch) >= EVENT_BATCH_SIZE:
-                    try:
-                        status_code, response_text = post_events_batch(event_batch)
-                        if status_code in (200, 202):
-                            # ✅ SUCCESS: Purchase events posted to Optimizely
-                            # Only mark as processed AFTER successful API response (200/202)
-                            # This ensures we don't lose customers if API call fails
-                            for key in event_batch_keys:
-                                new_event_keys.add(key)
-                            posted_events += len(event_batch)
-                            
-                            # Only log batch posts in test mode or very small datasets
-                            if (RICS_TEST_MODE and rows_processed < 10) or (not RICS_TEST_MODE and total_rows <= 10):
-                                print(f"   ✅ Posted batch of {len(event_batch)} events (status: {status_code})")
-                        else:
-                            print(f"⚠️ Event batch post failed: {status_code} - {response_text[:200]}")
-                            print(f"   ⚠️ NOT marking {len(event_batch)} events as processed (will retry next run)")
-                            # Don't add to new_event_keys - will retry next time
-                        event_batch = []  # Clear batch
-                        event_batch_keys = []  # Clear keys
-                    except Exception as e:
-                        print(f"❌ Error posting event batch: {e}")
-                        print(f"   ⚠️ NOT marking events as processed (will retry next run)")
-                        event_batch = []  # Clear batch on error
-                        event_batch_keys = []  # Clear keys
+                    # Only log batch posts in test mode or very small datasets
+                    verbose = (RICS_TEST_MODE and rows_processed < 10) or (not RICS_TEST_MODE and total_rows <= 10)
+                    pending_posts.append(post_executor.submit(_post_event_batch, event_batch, event_batch_keys, "", verbose))
+                    event_batch = []  # Start new batch (the submitted one is owned by the worker)
+                    event_batch_keys = []
+                    
+                    # Apply backpressure and collect results of completed posts
+                    if len(pending_posts) > MAX_PENDING_POSTS:
+                        posted_events += _wait_for_posts(pending_posts, new_event_keys, MAX_PENDING_POSTS)
                 
             except Exception as e:
                 print(f"❌ Error processing row {row_idx}: {e}")
@@ -507,25 +556,18 @@ def process_rics_purchases(csv_path: str):
     
     # Flush any remaining events in batch
     if event_batch and not DRY_RUN:
-        try:
-            status_code, response_text = post_events_batch(event_batch)
-            if status_code in (200, 202):
-                # ✅ SUCCESS: Only mark as processed AFTER successful post
-                for key in event_batch_keys:
-                    new_event_keys.add(key)
-                posted_events += len(event_batch)
-                print(f"\n📦 Posted final batch of {len(event_batch)} purchase events (status: {status_code})")
-                print(f"   ✅ Marked {len(event_batch_keys)} events as processed in deduplication log")
-            else:
-                print(f"\n⚠️ Final event batch post failed: {status_code} - {response_text[:200]}")
-                print(f"   ⚠️ NOT marking {len(event_batch)} events as processed (will retry next run)")
-            event_batch = []
-            event_batch_keys = []
-        except Exception as e:
-            print(f"\n❌ Error posting final event batch: {e}")
-            print(f"   ⚠️ NOT marking events as processed (will retry next run)")
-            event_batch = []
-            event_batch_keys = []
+        pending_posts.append(post_executor.submit(_post_event_batch, event_batch, event_batch_keys, "final ", True))
+        event_batch = []
+        event_batch_keys = []
+    
+    # Wait for all in-flight batch posts before saving the deduplication log
+    final_posted = _wait_for_posts(pending_posts, new_event_keys)
+    posted_events += final_posted
+    post_executor.shutdown()
+    if final_posted:
+        print(f"   ✅ Marked {final_posted} events from the last batches as processed in deduplication log")
+    if posted_events:
+        print(f"   ✅ Marked {posted_events} events as processed this run")
     
     # Save processed events for next run (unless deduplication is disabled)
     if not RICS_DISABLE_DEDUPLICATION:
@@ -7,8 +7,15 @@ Provides functions to post profile updates and events to Optimizely.
 import os
 import time
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Dict, Optional, Tuple, Literal, List
+from typing import Dict, Optional, Tuple, Literal, List, Union
+
+# Optional faster JSON encoder (falls back to the stdlib json module)
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 OPTIMIZELY_API_TOKEN = os.getenv("OPTIMIZELY_API_TOKEN", "").strip()
@@ -20,6 +27,17 @@ MAX_RETRIES = 3
 RETRY_DELAY = 2  # seconds
 TIMEOUT = 30  # Increased from 10 to 30 seconds
 
+# Maximum number of events accepted by a single /v3/events batch request
+MAX_BATCH_SIZE = 500
+
+# Connection pool size for the shared session (covers concurrent posting threads)
+POOL_SIZE = 32
+
+# Shared session so every call reuses pooled keep-alive connections instead of
+# paying a new TCP/TLS handshake per request. Retries stay in the per-call loops.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE))
+
 
 def _get_headers() -> Dict[str, str]:
     """Get headers for Optimizely API requests."""
@@ -34,6 +52,13 @@ def _get_headers() -> Dict[str, str]:
     }
 
 
+def _serialize(payload: Union[Dict, List[Dict]]) -> bytes:
+    """Serialize a request payload to JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
 def get_profile(email: str) -> Optional[Dict]:
     """
     Fetch an existing profile from Optimizely by email.
@@ -66,7 +91,7 @@ def get_profile(email: str) -> Optional[Dict]:
         try:
             # Try GET with email as query parameter first
             # If that doesn't work, we'll try POST with identifiers in body
-            response = requests.get(
+            response = _SESSION.get(
                 OPTIMIZELY_PROFILES_ENDPOINT,
                 headers=headers,
                 params={"email": email},
@@ -75,7 +100,7 @@ def get_profile(email: str) -> Optional[Dict]:
             
             # If GET doesn't work (405 Method Not Allowed), try POST
             if response.status_code == 405:
-                response = requests.post(
+                response = _SESSION.post(
                     OPTIMIZELY_PROFILES_ENDPOINT,
                     headers=headers,
                     json=payload,
@@ -153,14 +178,15 @@ def subscribe_to_list(email: str, list_id: str) -> Tuple[int, str]:
     }
     
     OPTIMIZELY_SUBSCRIPTIONS_ENDPOINT = "https://api.zaius.com/v3/lists/subscriptions"
+    body = _serialize(payload)  # Serialize once, reused across retries
     
     # Retry logic for network errors and 5xx status codes
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 OPTIMIZELY_SUBSCRIPTIONS_ENDPOINT,  # Use dedicated subscriptions endpoint
                 headers=headers,
-                json=payload,
+                data=body,
                 timeout=TIMEOUT
             )
             
@@ -408,13 +434,15 @@ def post_profile(email: str, attrs: Dict, list_id: Optional[str] = None) -> Tupl
         print(f"   List ID: {list_id}")
         print(f"   Payload (lists field): {json_module.dumps(payload.get('lists', []), indent=2)}")
     
+    body = _serialize(payload)  # Serialize once, reused across retries
+    
     # Retry logic for network errors and 5xx status codes
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 OPTIMIZELY_EVENTS_ENDPOINT,  # Use events endpoint, not profiles
                 headers=headers,
-                json=payload,
+                data=body,
                 timeout=TIMEOUT
             )
             
@@ -504,13 +532,15 @@ def post_event(
     # Note: List subscription is handled separately via subscribe_to_list()
     # The events endpoint doesn't reliably handle list subscriptions
     
+    body = _serialize(payload)  # Serialize once, reused across retries
+    
     # Retry logic for network errors and 5xx status codes
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 OPTIMIZELY_EVENTS_ENDPOINT,
                 headers=headers,
-                json=payload,
+                data=body,
                 timeout=TIMEOUT
             )
             
@@ -552,7 +582,7 @@ def post_events_batch(events: List[Dict]) -> Tuple[int, str]:
     Post multiple events to Optimizely in a single batch request.
     
     This is much faster than posting events individually. The Optimizely API
-    accepts an array of events in a single POST request.
+    accepts an array of up to MAX_BATCH_SIZE events in a single POST request.
     
     Args:
         events: List of event dictionaries, each with:
@@ -571,13 +601,15 @@ def post_events_batch(events: List[Dict]) -> Tuple[int, str]:
     headers = _get_headers()
     
     # Optimizely API accepts an array of events
+    body = _serialize(events)  # Serialize once, reused across retries
+    
     # Retry logic for network errors and 5xx status codes
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            response = requests.post(
+            response = _SESSION.post(
                 OPTIMIZELY_EVENTS_ENDPOINT,
                 headers=headers,
-                json=events,  # Send array of events
+                data=body,  # Send array of events
                 timeout=TIMEOUT * 2  # Longer timeout for batches
             )
             
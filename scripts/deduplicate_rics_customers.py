@@ -1,7 +1,6 @@
 import csv
 import sys
 import os
-from collections import OrderedDict
 
 INPUT_PATH = sys.argv[1] if len(sys.argv) > 1 else 'optimizely_connector/output/rics_cleaned_last24h.csv'
 OUTPUT_PATH = sys.argv[2] if len(sys.argv) > 2 else 'optimizely_connector/output/rics_customers_deduped.csv'
@@ -12,15 +11,17 @@ customer_fields = [
 ]
 
 def deduplicate_customers(input_path, output_path):
-    customers = OrderedDict()
+    # First row per rics_id wins; setdefault does the lookup and insert in one
+    # hash pass, and DictWriter projects the kept rows onto customer_fields
+    customers = {}
     with open(input_path, newline='') as f:
         reader = csv.DictReader(f)
         for row in reader:
             cust_id = row["rics_id"]
-            if cust_id and cust_id not in customers:
-                customers[cust_id] = {field: row.get(field, "") for field in customer_fields}
+            if cust_id:
+                customers.setdefault(cust_id, row)
     with open(output_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=customer_fields)
+        writer = csv.DictWriter(f, fieldnames=customer_fields, restval="", extrasaction="ignore")
         writer.writeheader()
         writer.writerows(customers.values())
     print(f"✅ Wrote deduplicated customer CSV: {output_path} ({len(customers)} unique customers)")
@@ -2,13 +2,36 @@
 import os
 from datetime import datetime
 import sys
+import atexit
+import threading
+
+LOG_FILE_PATH = "logs/fetch_rics_debug.log"
+
+# Opened on first use and kept for the life of the process (line buffered, so
+# each message still lands on disk immediately) instead of open/close per line
+_log_file = None
+_log_lock = threading.Lock()
+
+
+def _get_log_file():
+    global _log_file
+    if _log_file is None:
+        try:
+            _log_file = open(LOG_FILE_PATH, "a", buffering=1)
+        except OSError:
+            return None  # logs dir may not exist yet; retry on the next message
+        atexit.register(_log_file.close)
+    return _log_file
+
 
 def log_message(msg):
     line = f"{datetime.now()} {msg}"
     print(line)  # ✅ ensures stdout capture
     sys.stdout.flush()
     try:
-        with open("logs/fetch_rics_debug.log", "a") as f:
-            f.write(line + "\n")
+        with _log_lock:
+            f = _get_log_file()
+            if f is not None:
+                f.write(line + "\n")
     except Exception:
         pass  # don’t crash if logs dir doesn’t exist
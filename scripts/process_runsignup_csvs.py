@@ -12,8 +12,13 @@ import csv
 import io
 import re
 import hashlib
+import logging
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Optional, List, Tuple, Set
+from operator import itemgetter
+from typing import IO, Callable, Dict, Optional, List, Tuple, Set
 
 # Add parent directory to path for imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -23,11 +28,40 @@ from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2 import service_account
 
 from runsignup_connector.optimizely_client import (
+    MAX_BATCH_SIZE,
     post_event,
     post_events_batch
 )
 
 
+class _BufferedStreamHandler(logging.StreamHandler):
+    """
+    StreamHandler that leaves flushing to the stream's own buffering.
+    
+    logging.StreamHandler flushes after every record, which costs a write syscall per
+    progress line when stdout is a pipe (CI). Records still share sys.stdout's buffer
+    with print(), so ordering is preserved; warnings and errors flush immediately.
+    """
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if record.levelno >= logging.WARNING:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+# Logging: per-row messages go through the logger so they are only formatted when
+# enabled (set LOG_LEVEL=DEBUG to see every DRY_RUN row)
+logger = logging.getLogger("runsignup_csvs")
+if not logger.handlers:
+    _log_handler = _BufferedStreamHandler(sys.stdout)
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO))
+    logger.propagate = False
+
 # Configuration
 # IMPORTANT: DRY_RUN defaults to "true" for safety
 # Set DRY_RUN="false" in GitHub Secrets to actually post data
@@ -36,16 +70,43 @@ DRY_RUN = os.getenv("DRY_RUN", "true").lower() == "true"
 GDRIVE_CREDENTIALS = os.getenv("GDRIVE_CREDENTIALS", "").strip()
 RSU_FOLDER_IDS = os.getenv("RSU_FOLDER_IDS", "").strip()
 OPTIMIZELY_EVENT_NAME = "runsignup_registration"  # Consistent event type
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024  # Download CSVs from Drive in 16MB chunks
+# CSV files downloaded in parallel (one Drive service per worker); capped at 8 to stay
+# well under Drive's per-user request rate
+DOWNLOAD_WORKERS = max(1, min(int(os.getenv("RSU_DOWNLOAD_CONCURRENCY", "4")), 8))
+
+# Rows per Optimizely batch request (capped at the /v3/events per-request maximum)
+OPTIMIZELY_BATCH_SIZE = max(1, min(int(os.getenv("OPTIMIZELY_BATCH_SIZE", str(MAX_BATCH_SIZE))), MAX_BATCH_SIZE))
+
+# Batch posts run on background threads so CSV parsing is not blocked on the network
+POST_WORKERS = max(1, int(os.getenv("RSU_POST_WORKERS", "4")))
+MAX_PENDING_POSTS = POST_WORKERS * 2  # Backpressure: wait once this many row groups are in flight
 
 # TEST MODE configuration
 RSU_TEST_MODE = os.getenv("RSU_TEST_MODE", "false").lower() == "true"
 RSU_TEST_EMAIL = os.getenv("RSU_TEST_EMAIL", "").strip()
 RSU_TEST_MAX_ROWS = 5  # Process only 5 rows in test mode
 
-# Event deduplication
-PROCESSED_EVENTS_LOG = os.path.join(os.path.dirname(__file__), "..", "logs", "processed_runsignup_events.json")
+# Event deduplication (append-only, one event key hash per line)
+PROCESSED_EVENTS_LOG = os.path.join(os.path.dirname(__file__), "..", "logs", "processed_runsignup_events.txt")
+# Previous JSON format, read once to seed the line-delimited log
+LEGACY_PROCESSED_EVENTS_LOG = os.path.join(os.path.dirname(__file__), "..", "logs", "processed_runsignup_events.json")
+
+# Drive listing cache: reuse a folder's file list when its newest file is unchanged.
+# Off by default (logs/ is not persisted in CI, so it would never hit there)
+# Set RSU_DRIVE_LIST_CACHE="true" to enable it for local runs with large folders
+DRIVE_LIST_CACHE = os.getenv("RSU_DRIVE_LIST_CACHE", "false").lower() == "true"
+DRIVE_MANIFEST_LOG = os.path.join(os.path.dirname(__file__), "..", "logs", "runsignup_drive_manifest.json")
+
+# Synced-file cursors: skip a folder whose newest CSV was already fully synced by a live run
+# Set RSU_RESYNC_FILES="true" to re-process the newest CSV regardless
+RSU_RESYNC_FILES = os.getenv("RSU_RESYNC_FILES", "false").lower() == "true"
+SYNCED_FILES_LOG = os.path.join(os.path.dirname(__file__), "..", "logs", "runsignup_synced_files.json")
 
 # Partner to Optimizely list ID mapping is built dynamically in load_partner_mappings()
+# from every GDRIVE_FOLDER_ID_{partner_id} / OPTIMIZELY_LIST_ID_{partner_id} env var
+FOLDER_ENV_PREFIX = "GDRIVE_FOLDER_ID_"
+LIST_ENV_PREFIX = "OPTIMIZELY_LIST_ID_"
 
 # Header mapping: RunSignup CSV headers -> canonical keys
 HEADER_MAP = {
@@ -62,6 +123,27 @@ HEADER_MAP = {
     "Race": "race",
 }
 
+# Registration timestamp formats seen in RunSignup exports
+TIMESTAMP_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S %p",
+]
+
+# ISO-style timestamps accepted by the first four TIMESTAMP_FORMATS; only these take
+# the datetime.fromisoformat fast path (it also accepts date-only and UTC offset
+# strings, which strptime rejects and which must keep falling back as before)
+_ISO_TIMESTAMP_RE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}[ T][0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]{1,6})?")
+
+# Case-insensitive lookup of HEADER_MAP, built once at import time
+_HEADER_MAP_CI = {k.strip().lower(): v for k, v in HEADER_MAP.items()}
+
+# Basic email validation pattern, compiled once at import time
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 
 def _validate_required_env():
     """Validate that all required environment variables are set."""
@@ -102,39 +184,33 @@ def load_partner_mappings():
     
     print(f"🔍 DEBUG: Parsed partner IDs from RSU_FOLDER_IDS: {', '.join(enabled_partner_ids)}")
     
-    # Build partner → folder mapping
+    # Build partner → folder and partner → list mappings in a single environment scan
+    # (any GDRIVE_FOLDER_ID_{partner_id} / OPTIMIZELY_LIST_ID_{partner_id} pair is picked up,
+    # so adding a partner requires no code change)
     partner_to_folder = {}
     partner_to_list = {}
     
-    # Known partners
-    known_partners = ["1384", "1385", "1411"]
-    
-    for partner_id in known_partners:
-        folder_id = os.getenv(f"GDRIVE_FOLDER_ID_{partner_id}", "").strip()
-        list_id = os.getenv(f"OPTIMIZELY_LIST_ID_{partner_id}", "").strip()
-        
-        if folder_id:
-            partner_to_folder[partner_id] = folder_id
-            print(f"🔍 DEBUG: GDRIVE_FOLDER_ID_{partner_id}: {folder_id[-6:]}")
-        else:
-            print(f"🔍 DEBUG: GDRIVE_FOLDER_ID_{partner_id}: NOT SET")
-        
-        if list_id:
-            partner_to_list[partner_id] = list_id
-        else:
-            print(f"🔍 DEBUG: OPTIMIZELY_LIST_ID_{partner_id}: NOT SET")
-    
-    # Validate that every enabled partner has required config
-    missing_config = []
-    for partner_id in enabled_partner_ids:
-        if partner_id not in known_partners:
-            missing_config.append(f"Partner {partner_id} is not a known partner (known: {', '.join(known_partners)})")
-        elif partner_id not in partner_to_folder:
-            missing_config.append(f"Partner {partner_id} missing GDRIVE_FOLDER_ID_{partner_id}")
-        elif partner_id not in partner_to_list:
-            missing_config.append(f"Partner {partner_id} missing OPTIMIZELY_LIST_ID_{partner_id}")
-    
-    if missing_config:
+    for env_key, env_value in os.environ.items():
+        env_value = env_value.strip()
+        if not env_value:
+            continue
+        if env_key.startswith(FOLDER_ENV_PREFIX):
+            partner_to_folder[env_key[len(FOLDER_ENV_PREFIX):]] = env_value
+        elif env_key.startswith(LIST_ENV_PREFIX):
+            partner_to_list[env_key[len(LIST_ENV_PREFIX):]] = env_value
+    
+    # Validate that every enabled partner has required config (one set difference per prefix)
+    enabled = set(enabled_partner_ids)
+    missing_folders = enabled - partner_to_folder.keys()
+    missing_lists = enabled - partner_to_list.keys()
+    
+    if missing_folders or missing_lists:
+        missing_config = []
+        for partner_id in enabled_partner_ids:
+            if partner_id in missing_folders:
+                missing_config.append(f"Partner {partner_id} missing {FOLDER_ENV_PREFIX}{partner_id}")
+            if partner_id in missing_lists:
+                missing_config.append(f"Partner {partner_id} missing {LIST_ENV_PREFIX}{partner_id}")
         error_msg = "Configuration errors:\n  " + "\n  ".join(missing_config)
         raise RuntimeError(error_msg)
     
@@ -148,6 +224,9 @@ def load_partner_mappings():
     return enabled_partner_ids, partner_to_folder, partner_to_list
 
 
+_thread_local = threading.local()
+
+
 def _get_drive_service():
     """Initialize and return Google Drive service."""
     if not GDRIVE_CREDENTIALS:
@@ -162,46 +241,212 @@ def _get_drive_service():
         creds_info,
         scopes=["https://www.googleapis.com/auth/drive.readonly"]
     )
-    return build("drive", "v3", credentials=creds)
+    # The Drive v3 discovery document ships with googleapiclient; skip the legacy
+    # discovery file cache (unsupported with google-auth, it only logs a warning)
+    return build("drive", "v3", credentials=creds, cache_discovery=False)
+
+
+def load_drive_manifest() -> Dict[str, Dict]:
+    """
+    Load the cached Drive folder listings from the previous run.
+    
+    Returns:
+        Dict of folder_id -> {"newest": {"id", "modifiedTime"}, "files": List[Dict]}
+    """
+    if not DRIVE_LIST_CACHE or not os.path.exists(DRIVE_MANIFEST_LOG):
+        return {}
+    
+    try:
+        with open(DRIVE_MANIFEST_LOG, "r") as f:
+            data = json.load(f)
+            return data if isinstance(data, dict) else {}
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"⚠️ Warning: Could not load Drive manifest: {e}")
+        return {}
+
+
+def save_drive_manifest(manifest: Dict[str, Dict]):
+    """
+    Save Drive folder listings for reuse by the next run.
+    
+    Args:
+        manifest: Dict of folder_id -> {"newest": {"id", "modifiedTime"}, "files": List[Dict]}
+    """
+    if not DRIVE_LIST_CACHE:
+        return
+    
+    os.makedirs(os.path.dirname(DRIVE_MANIFEST_LOG), exist_ok=True)
+    
+    try:
+        with open(DRIVE_MANIFEST_LOG, "w") as f:
+            json.dump(manifest, f, indent=2)
+    except IOError as e:
+        print(f"⚠️ Warning: Could not save Drive manifest: {e}")
+
+
+def load_synced_files() -> Dict[str, Dict]:
+    """
+    Load the per-folder cursors of CSV files already synced by a live run.
+    
+    Returns:
+        Dict of folder_id -> {"id": str, "modifiedTime": str}
+    """
+    if not os.path.exists(SYNCED_FILES_LOG):
+        return {}
+    
+    try:
+        with open(SYNCED_FILES_LOG, "r") as f:
+            data = json.load(f)
+            return data if isinstance(data, dict) else {}
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"⚠️ Warning: Could not load synced files log: {e}")
+        return {}
+
+
+def save_synced_files(synced_files: Dict[str, Dict]):
+    """
+    Save per-folder cursors of synced CSV files for the next run.
+    
+    Args:
+        synced_files: Dict of folder_id -> {"id": str, "modifiedTime": str}
+    """
+    os.makedirs(os.path.dirname(SYNCED_FILES_LOG), exist_ok=True)
+    
+    try:
+        with open(SYNCED_FILES_LOG, "w") as f:
+            json.dump(synced_files, f, indent=2)
+    except IOError as e:
+        print(f"⚠️ Warning: Could not save synced files log: {e}")
+
+
+def _is_synced(cursor: Optional[Dict], file_info: Dict) -> bool:
+    """Return True if the synced-file cursor records this exact file version."""
+    return bool(cursor) and (
+        cursor.get("id") == file_info.get("id")
+        and cursor.get("modifiedTime") == file_info.get("modifiedTime")
+    )
 
 
-def drive_list_csvs(drive_service, folder_id: str) -> List[Dict]:
+def drive_list_csvs(
+    drive_service,
+    folder_id: str,
+    manifest: Optional[Dict[str, Dict]] = None,
+    refresh: bool = False
+) -> Tuple[List[Dict], bool]:
     """
     List CSV files in the Google Drive folder, supporting Shared Drives.
     
     Filters by file name ending in .csv (case-insensitive).
-    """
-    query = f"'{folder_id}' in parents and trashed = false"
     
+    If a manifest is given, the folder's most recently modified file is fetched
+    first (a one-result listing) and the cached listing is reused when that file's
+    id and modifiedTime are unchanged. A folder's own modifiedTime is not used:
+    Drive does not reliably bump it when files inside are added or edited. The
+    manifest is updated in place with fresh listings.
+    
+    Args:
+        drive_service: Google Drive service
+        folder_id: Folder to list
+        manifest: Cached listings from load_drive_manifest(), or None to disable the cache
+        refresh: Always list the folder from Drive (the manifest is still updated)
+    
+    Returns:
+        Tuple of (csv_files, from_cache)
+    """
     try:
-        response = drive_service.files().list(
-            q=query,
-            fields="files(id,name,modifiedTime,webViewLink)",
-            includeItemsFromAllDrives=True,
-            supportsAllDrives=True
-        ).execute()
+        # Drive's name "contains" only prefix-matches, so the .csv suffix check stays
+        # client-side; subfolders are excluded server-side to keep the listing small
+        query = (
+            f"'{folder_id}' in parents and trashed = false "
+            "and mimeType != 'application/vnd.google-apps.folder'"
+        )
+        
+        newest = None
+        if manifest is not None:
+            probe = drive_service.files().list(
+                q=query,
+                orderBy="modifiedTime desc",
+                fields="files(id,modifiedTime)",
+                pageSize=1,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True
+            ).execute().get("files", [])
+            if probe:
+                newest = {"id": probe[0].get("id"), "modifiedTime": probe[0].get("modifiedTime")}
+            cached = manifest.get(folder_id)
+            if not refresh and newest and cached and cached.get("newest") == newest:
+                print(f"   ♻️ Newest file unchanged since last run, reusing cached file list")
+                return list(cached.get("files", [])), True
+        
+        # Request the largest page Drive allows and follow nextPageToken, so folders
+        # with more than one page of files are listed completely in few round-trips
+        files = []
+        page_token = None
+        while True:
+            response = drive_service.files().list(
+                q=query,
+                fields="nextPageToken,files(id,name,modifiedTime,webViewLink)",
+                pageSize=1000,
+                pageToken=page_token,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True
+            ).execute()
+            files.extend(response.get("files", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
         
-        files = response.get("files", [])
         # Filter by name ending in .csv (case-insensitive)
-        return [f for f in files if f.get("name", "").lower().endswith(".csv")]
+        csv_files = [f for f in files if f.get("name", "").lower().endswith(".csv")]
+        
+        if manifest is not None and newest:
+            manifest[folder_id] = {
+                "newest": newest,
+                "files": list(csv_files)
+            }
+        
+        return csv_files, False
     except Exception as e:
         raise RuntimeError(f"Failed to list files in Google Drive folder {folder_id[-6:]}: {e}")
 
 
-def _download_csv(drive_service, file_id: str) -> str:
-    """Download a CSV file from Google Drive and return its content as a string."""
+def _get_thread_drive_service():
+    """
+    Return a Google Drive service owned by the calling thread.
+    
+    The googleapiclient/httplib2 transport is not thread-safe, so each download
+    worker builds (and then reuses) its own service.
+    """
+    service = getattr(_thread_local, "drive_service", None)
+    if service is None:
+        service = _get_drive_service()
+        _thread_local.drive_service = service
+    return service
+
+
+def _download_csv(file_id: str) -> IO[bytes]:
+    """
+    Download a CSV file from Google Drive into a temporary file.
+    
+    Runs on a download worker thread so files are fetched in parallel with
+    parsing. The content is spooled to disk rather than held in memory.
+    
+    Returns:
+        Binary temporary file positioned at the start (deleted when closed)
+    """
+    csv_file = tempfile.TemporaryFile()
     try:
-        request = drive_service.files().get_media(fileId=file_id)
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
+        request = _get_thread_drive_service().files().get_media(fileId=file_id)
+        downloader = MediaIoBaseDownload(csv_file, request, chunksize=DOWNLOAD_CHUNK_SIZE)
         
         done = False
         while not done:
             _, done = downloader.next_chunk()
         
-        file_content.seek(0)
-        return file_content.read().decode("utf-8")
+        csv_file.seek(0)
+        return csv_file
     except Exception as e:
+        csv_file.close()
         raise RuntimeError(f"Failed to download CSV file {file_id}: {e}")
 
 
@@ -212,9 +457,14 @@ def _normalize_email(email: str) -> Optional[str]:
     
     email = email.strip().lower()
     
+    # Cheap pre-check: needs a local part before '@' and a '.' in the domain.
+    # Rejects blank/malformed values without entering the regex.
+    at = email.find("@")
+    if at < 1 or email.rfind(".") < at:
+        return None
+    
     # Basic email validation
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(email_pattern, email):
+    if not _EMAIL_RE.match(email):
         return None
     
     return email
@@ -235,13 +485,13 @@ def _generate_event_key(email: str, event_props: Dict, registration_ts: Optional
     Returns:
         SHA256 hash of the event key components
     """
-    # Build key from unique identifiers
+    # Build key from unique identifiers (already normalized/stripped by the row mapper)
     key_parts = [
-        email.lower().strip(),
-        str(event_props.get("event", "")).strip(),
-        str(event_props.get("event_year", "")).strip(),
-        str(event_props.get("bib", "")).strip(),
-        str(registration_ts or "").strip()
+        email,
+        str(event_props.get("event", "")),
+        str(event_props.get("event_year", "")),
+        str(event_props.get("bib", "")),
+        registration_ts or ""
     ]
     
     # Join and hash
@@ -249,18 +499,18 @@ def _generate_event_key(email: str, event_props: Dict, registration_ts: Optional
     return hashlib.sha256(key_string.encode("utf-8")).hexdigest()
 
 
-def load_processed_events() -> Set[str]:
+def _load_legacy_processed_events() -> Set[str]:
     """
-    Load set of previously processed event keys from log file.
+    Load event keys from the previous JSON deduplication log, if present.
     
     Returns:
         Set of event key hashes
     """
-    if not os.path.exists(PROCESSED_EVENTS_LOG):
+    if not os.path.exists(LEGACY_PROCESSED_EVENTS_LOG):
         return set()
     
     try:
-        with open(PROCESSED_EVENTS_LOG, "r") as f:
+        with open(LEGACY_PROCESSED_EVENTS_LOG, "r") as f:
             data = json.load(f)
             # Handle both old format (list) and new format (dict with keys)
             if isinstance(data, list):
@@ -270,129 +520,327 @@ def load_processed_events() -> Set[str]:
             else:
                 return set()
     except (json.JSONDecodeError, IOError) as e:
+        print(f"⚠️ Warning: Could not load legacy processed events log: {e}")
+        return set()
+
+
+def _event_key_id(event_key: str) -> int:
+    """
+    Compact in-memory form of an event key: the first 64 bits of its hash.
+    
+    A small int takes about half the memory of the 64-char hex string, and a
+    64-bit prefix keeps collisions negligible at millions of tracked events.
+    
+    Raises:
+        ValueError: If the key is shorter than 16 characters or not hex
+    """
+    if len(event_key) < 16:
+        raise ValueError(f"event key too short: {event_key!r}")
+    return int(event_key[:16], 16)
+
+
+def _event_key_ids(keys) -> Set[int]:
+    """
+    Convert stored event keys to key ids, skipping (and warning about) malformed ones.
+    
+    A line truncated by an interrupted append must not abort the whole sync.
+    """
+    key_ids = set()
+    malformed = 0
+    for key in keys:
+        if not isinstance(key, str):
+            malformed += 1
+            continue
+        key = key.strip()
+        if not key:
+            continue
+        try:
+            key_ids.add(_event_key_id(key))
+        except ValueError:
+            malformed += 1
+    if malformed:
+        print(f"⚠️ Warning: Skipped {malformed} malformed entries in processed events log")
+    return key_ids
+
+
+def load_processed_events() -> Set[int]:
+    """
+    Load set of previously processed event keys from log file.
+    
+    Falls back to the legacy JSON log until the line-delimited log exists.
+    
+    Returns:
+        Set of event key ids (see _event_key_id)
+    """
+    if not os.path.exists(PROCESSED_EVENTS_LOG):
+        return _event_key_ids(_load_legacy_processed_events())
+    
+    try:
+        with open(PROCESSED_EVENTS_LOG, "r") as f:
+            return _event_key_ids(f)
+    except IOError as e:
         print(f"⚠️ Warning: Could not load processed events log: {e}")
         return set()
 
 
-def save_processed_events(event_keys: Set[str]):
+def append_processed_events(new_keys: Set[str]):
     """
-    Save processed event keys to log file.
+    Append newly processed event keys to the log file.
+    
+    Only this run's keys are written, so the cost no longer grows with the
+    size of the log. On the first write the legacy JSON keys are carried over.
     
     Args:
-        event_keys: Set of event key hashes to save
+        new_keys: Set of event key hashes first processed in this run
     """
     os.makedirs(os.path.dirname(PROCESSED_EVENTS_LOG), exist_ok=True)
     
-    # Save as JSON with metadata
-    data = {
-        "events": sorted(list(event_keys)),
-        "last_updated": datetime.now(timezone.utc).isoformat(),
-        "total_events": len(event_keys)
-    }
+    keys = new_keys
+    if not os.path.exists(PROCESSED_EVENTS_LOG):
+        keys = _load_legacy_processed_events() | new_keys
     
     try:
-        with open(PROCESSED_EVENTS_LOG, "w") as f:
-            json.dump(data, f, indent=2)
+        with open(PROCESSED_EVENTS_LOG, "a") as f:
+            f.writelines(f"{key}\n" for key in keys)
     except IOError as e:
         print(f"⚠️ Warning: Could not save processed events log: {e}")
 
 
-def _parse_timestamp(ts_str: str) -> Optional[str]:
-    """Parse registration timestamp and convert to ISO 8601 format."""
-    if not ts_str or not ts_str.strip():
-        return None
+def _make_timestamp_parser() -> Callable[[Optional[str]], Optional[str]]:
+    """
+    Build a registration timestamp parser for one CSV file.
     
-    ts_str = ts_str.strip()
+    Timestamps within a file nearly always share one format, so the parser
+    remembers the last format that matched and tries it first on the next row.
     
-    # Try common formats
-    formats = [
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M:%S.%f",
-        "%Y-%m-%dT%H:%M:%S",
-        "%Y-%m-%dT%H:%M:%S.%f",
-        "%m/%d/%Y %H:%M:%S",
-        "%m/%d/%Y %H:%M:%S %p",
-    ]
+    Returns:
+        Function converting a timestamp string to ISO 8601 (None if blank)
+    """
+    formats = list(TIMESTAMP_FORMATS)
     
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(ts_str, fmt)
+    def parse_timestamp(ts_str: Optional[str]) -> Optional[str]:
+        if not ts_str or not ts_str.strip():
+            return None
+        
+        ts_str = ts_str.strip()
+        
+        # Fast path: ISO-style dates (the usual RunSignup export) parse in C without
+        # format-string interpretation; anything else falls through to strptime
+        if _ISO_TIMESTAMP_RE.fullmatch(ts_str):
+            try:
+                dt = datetime.fromisoformat(ts_str)
+            except ValueError:
+                pass
+            else:
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=timezone.utc)
+                return dt.isoformat()
+        
+        for idx, fmt in enumerate(formats):
+            try:
+                dt = datetime.strptime(ts_str, fmt)
+            except ValueError:
+                continue
+            # Move the matching format to the front for subsequent rows
+            if idx:
+                formats.insert(0, formats.pop(idx))
             # Make timezone-aware (assume UTC if no timezone info)
             if dt.tzinfo is None:
                 dt = dt.replace(tzinfo=timezone.utc)
             return dt.isoformat()
-        except ValueError:
-            continue
+        
+        # If all formats fail, use current time
+        print(f"⚠️ Could not parse timestamp '{ts_str}', using current time")
+        return datetime.now(timezone.utc).isoformat()
+    
+    return parse_timestamp
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    """Strip a CSV value, returning None for missing or blank values."""
+    if not value:
+        return None
+    return value.strip() or None
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    """Convert a cleaned CSV value to int, returning None for non-numeric values."""
+    # isdecimal() check avoids raising/catching ValueError on blank or garbage values
+    if value and value.isdecimal():
+        return int(value)
+    return None
+
+
+def _build_column_index(header: Optional[List[str]]) -> Dict[str, int]:
+    """
+    Resolve CSV headers to canonical keys once per file (case-insensitive).
+    
+    Headers not in HEADER_MAP are kept under their lower-cased, underscored form,
+    so a column already named like a canonical key ("Email", "Event Name") still
+    resolves.
     
-    # If all formats fail, use current time
-    print(f"⚠️ Could not parse timestamp '{ts_str}', using current time")
-    return datetime.now(timezone.utc).isoformat()
+    Returns:
+        Dict of canonical_key -> column index (if a key repeats, the last column wins)
+    """
+    column_index = {}
+    for idx, csv_key in enumerate(header or []):
+        csv_key = csv_key.strip().lower()
+        column_index[_HEADER_MAP_CI.get(csv_key) or csv_key.replace(" ", "_")] = idx
+    return column_index
 
 
-def _map_row(row: Dict) -> Tuple[Optional[Dict], Optional[Dict], Optional[str]]:
+def _field_getter(column_index: Dict[str, int], canonical: str) -> Callable[[List[str]], Optional[str]]:
+    """Return a getter for a canonical field, or one that yields None if the column is absent."""
+    if canonical not in column_index:
+        return lambda row: None
+    return itemgetter(column_index[canonical])
+
+
+def _build_row_mapper(header: Optional[List[str]]) -> Callable[[List[str]], Tuple[Optional[Dict], Optional[Dict], Optional[str], Optional[str]]]:
     """
-    Map a CSV row to profile attributes and event properties.
+    Build a row mapper specialized to one file's header.
+    
+    Header resolution is done once here; the returned function reads each
+    canonical field straight from its column position with no per-row lookups
+    in HEADER_MAP or intermediate normalized dict.
+    
+    Args:
+        header: CSV header row as returned by csv.reader
     
     Returns:
-        Tuple of (profile_attrs, event_props, registration_ts) or (None, None, None) if row is invalid
-    """
-    # Normalize headers (case-insensitive)
-    normalized_row = {}
-    for csv_key, value in row.items():
-        csv_key_clean = csv_key.strip()
-        if csv_key_clean in HEADER_MAP:
-            normalized_row[HEADER_MAP[csv_key_clean]] = value
-        else:
-            # Keep original key if not in map
-            normalized_row[csv_key_clean.lower().replace(" ", "_")] = value
-    
-    # Extract and validate email
-    email = _normalize_email(normalized_row.get("email", ""))
-    if not email:
-        return None, None, None
-    
-    # Build profile attributes
-    profile_attrs = {
-        "first_name": normalized_row.get("first_name", "").strip() or None,
-        "last_name": normalized_row.get("last_name", "").strip() or None,
-        "rsu_event": normalized_row.get("event_name", "").strip() or None,
-        "rsu_event_year": normalized_row.get("event_year", "").strip() or None,
-    }
-    
-    # Remove None values
-    profile_attrs = {k: v for k, v in profile_attrs.items() if v is not None}
-    
-    # Build event properties
-    event_props = {
-        "event": normalized_row.get("event_name", "").strip() or None,
-        "event_year": normalized_row.get("event_year", "").strip() or None,
-        "bib": normalized_row.get("bib", "").strip() or None,
-        "gender": normalized_row.get("gender", "").strip() or None,
-        "age": normalized_row.get("age", "").strip() or None,
-        "race": normalized_row.get("race", "").strip() or None,
-    }
-    
-    # Convert age to int if possible
-    if event_props.get("age"):
-        try:
-            event_props["age"] = int(event_props["age"])
-        except (ValueError, TypeError):
-            event_props["age"] = None
+        Function mapping a csv.reader row to (profile_attrs, event_props, registration_ts, email),
+        or (None, None, None, None) if the row is invalid
+    """
+    column_index = _build_column_index(header)
+    width = len(header or [])
+    get_email = _field_getter(column_index, "email")
+    get_first_name = _field_getter(column_index, "first_name")
+    get_last_name = _field_getter(column_index, "last_name")
+    get_event_name = _field_getter(column_index, "event_name")
+    get_event_year = _field_getter(column_index, "event_year")
+    get_bib = _field_getter(column_index, "bib")
+    get_gender = _field_getter(column_index, "gender")
+    get_age = _field_getter(column_index, "age")
+    get_race = _field_getter(column_index, "race")
+    get_registration_ts = _field_getter(column_index, "registration_ts")
+    parse_timestamp = _make_timestamp_parser()
+    
+    def map_row(row: List[str]) -> Tuple[Optional[Dict], Optional[Dict], Optional[str], Optional[str]]:
+        # Pad short rows so missing trailing columns read as blank
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        
+        # Extract and validate email
+        email = _normalize_email(get_email(row))
+        if not email:
+            return None, None, None, None
+        
+        # Clean each canonical field once (event name/year are shared by profile and event)
+        event_name = _clean(get_event_name(row))
+        event_year = _clean(get_event_year(row))
+        
+        # Build profile attributes, adding only fields that have a value
+        profile_attrs = {}
+        first_name = _clean(get_first_name(row))
+        if first_name is not None:
+            profile_attrs["first_name"] = first_name
+        last_name = _clean(get_last_name(row))
+        if last_name is not None:
+            profile_attrs["last_name"] = last_name
+        if event_name is not None:
+            profile_attrs["rsu_event"] = event_name
+        if event_year is not None:
+            profile_attrs["rsu_event_year"] = event_year
+        
+        # Build event properties, skipping missing and "NULL" placeholder values
+        event_props = {}
+        if event_name is not None and event_name != "NULL":
+            event_props["event"] = event_name
+        event_year_int = _to_int(event_year)
+        if event_year_int is not None:
+            event_props["event_year"] = event_year_int
+        bib = _clean(get_bib(row))
+        if bib is not None and bib != "NULL":
+            event_props["bib"] = bib
+        gender = _clean(get_gender(row))
+        if gender is not None and gender != "NULL":
+            event_props["gender"] = gender
+        age = _to_int(_clean(get_age(row)))
+        if age is not None:
+            event_props["age"] = age
+        race = _clean(get_race(row))
+        if race is not None and race != "NULL":
+            event_props["race"] = race
+        
+        # Parse timestamp
+        registration_ts = parse_timestamp(get_registration_ts(row))
+        
+        return profile_attrs, event_props, registration_ts, email
     
-    # Convert event_year to int if possible
-    if event_props.get("event_year"):
-        try:
-            event_props["event_year"] = int(event_props["event_year"])
-        except (ValueError, TypeError):
-            event_props["event_year"] = None
+    return map_row
+
+
+def _post_batch(batch: List[Dict], label: str) -> int:
+    """
+    Post a batch of event payloads (profile updates or registrations) to Optimizely.
+    
+    Args:
+        batch: List of event payloads
+        label: Human-readable batch label for logging (e.g., "profile", "event")
+    
+    Returns:
+        Number of payloads accepted by Optimizely (0 on failure)
+    """
+    try:
+        status_code, response_text = post_events_batch(batch)
+    except Exception as e:
+        logger.error("❌ Error posting %s batch: %s", label, e)
+        return 0
+    
+    if status_code in (200, 202):
+        logger.info("   📦 Posted %s batch of %d", label, len(batch))
+        return len(batch)
+    
+    logger.warning("⚠️ %s batch post failed: %s - %s", label.capitalize(), status_code, response_text[:200])
+    return 0
+
+
+def _post_row_batches(profile_batch: List[Dict], event_batch: List[Dict], label: str) -> Tuple[int, int]:
+    """
+    Post the profile updates for a group of rows, then their registration events.
     
-    # Remove None/empty values
-    event_props = {k: v for k, v in event_props.items() if v not in (None, "", "NULL")}
+    Runs on a worker thread. Profiles are posted before events so each profile
+    (and its list subscription) is upserted before its matching event arrives,
+    while separate row groups are still posted concurrently. This ordering only
+    holds within a group, so every event's profile update must be in the same
+    group (profile dedup is per group for that reason).
     
-    # Parse timestamp
-    registration_ts = _parse_timestamp(normalized_row.get("registration_ts", ""))
+    Returns:
+        Tuple of (accepted_profiles, accepted_events)
+    """
+    accepted_profiles = _post_batch(profile_batch, f"{label}profile") if profile_batch else 0
+    accepted_events = _post_batch(event_batch, f"{label}event") if event_batch else 0
+    return accepted_profiles, accepted_events
+
+
+def _wait_for_posts(pending_posts: List[Future], max_pending: int = 0) -> Tuple[int, int]:
+    """
+    Wait for in-flight batch posts (oldest first) until at most max_pending remain.
+    
+    Args:
+        pending_posts: List of _post_row_batches futures; completed entries are removed
+        max_pending: Number of posts allowed to stay in flight
     
-    return profile_attrs, event_props, registration_ts
+    Returns:
+        Tuple of (accepted_profiles, accepted_events) for the posts that completed
+    """
+    accepted_profiles = 0
+    accepted_events = 0
+    while len(pending_posts) > max_pending:
+        profiles, events = pending_posts.pop(0).result()
+        accepted_profiles += profiles
+        accepted_events += events
+    return accepted_profiles, accepted_events
 
 
 def process_runsignup_csvs():
@@ -435,8 +883,11 @@ def process_runsignup_csvs():
     
     # Collect files from all partner folders
     # For each folder, select only the most recent CSV file
-    files_global = []
+    # Entries are (partner_id, folder_id, list_id, file_info); Drive metadata is not mutated
+    files_global: List[Tuple[str, str, str, Dict]] = []
     folders_processed = 0
+    drive_manifest = load_drive_manifest() if DRIVE_LIST_CACHE else None
+    synced_files = load_synced_files()
     
     for partner_id in enabled_partner_ids:
         folder_id = partner_to_folder[partner_id]
@@ -448,7 +899,12 @@ def process_runsignup_csvs():
         
         # List CSV files in this folder
         try:
-            files = drive_list_csvs(drive_service, folder_id)
+            files, from_cache = drive_list_csvs(drive_service, folder_id, drive_manifest)
+            cursor = None if RSU_RESYNC_FILES else synced_files.get(folder_id)
+            # A cached listing is never enough to skip a folder: if it matches the cursor,
+            # confirm against a fresh listing (a stale cache would match the cursor too)
+            if from_cache and files and _is_synced(cursor, max(files, key=lambda f: f.get("modifiedTime", ""))):
+                files, _ = drive_list_csvs(drive_service, folder_id, drive_manifest, refresh=True)
             print(f"   Found {len(files)} CSV file(s)")
             
             if not files:
@@ -459,12 +915,14 @@ def process_runsignup_csvs():
             files.sort(key=lambda f: f.get("modifiedTime", ""), reverse=True)
             most_recent_file = files[0]
             
-            # Attach metadata for routing
-            most_recent_file["_partner_id"] = partner_id
-            most_recent_file["_folder_id"] = folder_id
-            most_recent_file["_list_id"] = list_id
+            # ⚡ OPTIMIZATION: Skip the folder if its newest CSV was already synced by a live run
+            if _is_synced(cursor, most_recent_file):
+                logger.info("   ⏭️  Skipping %s (id ...%s, modified %s): already synced by a previous run",
+                            most_recent_file.get("name", "unknown"), most_recent_file.get("id", "")[-6:],
+                            most_recent_file.get("modifiedTime", "unknown"))
+                continue
             
-            files_global.append(most_recent_file)
+            files_global.append((partner_id, folder_id, list_id, most_recent_file))
             
             # Log the selected file and other available files
             print(f"   ✅ Selected: {most_recent_file.get('name', 'unknown')}")
@@ -477,28 +935,42 @@ def process_runsignup_csvs():
             print(f"❌ Error listing files in folder {folder_id[-6:]}: {e}")
             continue
     
+    if drive_manifest is not None:
+        save_drive_manifest(drive_manifest)
+    
     if not files_global:
-        print(f"\n⚠️ No CSV files found in any folder (processed {folders_processed} folder(s))")
+        print(f"\n⚠️ No new CSV files found in any folder (processed {folders_processed} folder(s))")
         return 0
     
     print(f"\n📂 Total CSVs selected: {len(files_global)}")
     
     # Log selected files with full details
     print("\n📋 Files to process:")
-    for idx, f in enumerate(files_global, 1):
+    for idx, (partner_id, folder_id, list_id, f) in enumerate(files_global, 1):
         modified_time = f.get("modifiedTime", "unknown")
         print(f"   {idx}. {f['name']}")
-        print(f"      Partner: {f['_partner_id']} | Folder: {f['_folder_id'][-6:]} | List: {f['_list_id']}")
+        print(f"      Partner: {partner_id} | Folder: {folder_id[-6:]} | List: {list_id}")
         print(f"      Modified: {modified_time}")
         if f.get("webViewLink"):
             print(f"      Link: {f['webViewLink']}")
     
     print()
     
+    # ⚡ OPTIMIZATION: Start all downloads in parallel; each file is parsed as soon as it is ready
+    download_executor = ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(files_global)))
+    download_futures = [download_executor.submit(_download_csv, f["id"]) for _, _, _, f in files_global]
+    download_executor.shutdown(wait=False)
+    
     # Load processed events for deduplication
     processed_event_keys = load_processed_events()
     new_event_keys = set()  # Track new events processed in this run
     skipped_duplicate_events = 0
+    # (email, list_id, event_year) profile updates already in the current row group; a
+    # registrant repeated within a group only needs one customer_update per list and year.
+    # Cleared whenever a group is submitted: row groups post concurrently, so a profile
+    # is only skipped when the group carrying it is also the one carrying the event
+    seen_profiles: Set[Tuple[str, str, Optional[int]]] = set()
+    skipped_duplicate_profiles = 0
     
     if not DRY_RUN:
         print(f"📋 Loaded {len(processed_event_keys)} previously processed events for deduplication")
@@ -509,104 +981,114 @@ def process_runsignup_csvs():
     skipped_rows = 0
     posted_profiles = 0
     posted_events = 0
+    queued_profiles = 0  # Profile updates queued for posting
+    queued_events = 0  # Events queued for posting
     subscribed_to_lists = 0  # Track successful list subscriptions
     rows_processed = 0  # Track rows that were actually processed (valid rows)
     sample_rows_by_partner = {}  # Store first 2 mapped rows per partner for DRY_RUN logging
+    samples_needed = {partner_id: 2 for partner_id in enabled_partner_ids} if DRY_RUN else {}
     processed_files = []  # Track which files were actually processed
     detailed_log_count = 0  # Track how many rows we've logged in detail (first few rows)
     MAX_DETAILED_LOGS = 5  # Log first 5 rows in detail
     
-    # ⚡ OPTIMIZATION: Batch event posting (increased from 100 for better throughput)
-    EVENT_BATCH_SIZE = 250  # Send events in batches of 250
+    # ⚡ OPTIMIZATION: Batch event posting (defaults to the API's per-request maximum)
+    EVENT_BATCH_SIZE = OPTIMIZELY_BATCH_SIZE
     # ⚡ OPTIMIZATION: Batch profile updates (customer_update events) for much faster processing
-    PROFILE_BATCH_SIZE = 250  # Send profile updates in batches of 250
+    PROFILE_BATCH_SIZE = OPTIMIZELY_BATCH_SIZE
     event_batch = []  # Collect events for batch posting
     profile_batch = []  # Collect profile updates for batch posting
+    post_executor = ThreadPoolExecutor(max_workers=POST_WORKERS)
+    pending_posts = []  # In-flight _post_row_batches futures
     
-    for file_info in files_global:
-        file_id = file_info["id"]
+    for (partner_id, folder_id, list_id, file_info), download_future in zip(files_global, download_futures):
         file_name = file_info["name"]
-        partner_id = file_info["_partner_id"]
-        folder_id = file_info["_folder_id"]
-        list_id = file_info["_list_id"]  # Already attached during collection
         
         print(f"\n{'='*60}")
         print(f"📄 Processing file: {file_name}")
         print(f"   Partner: {partner_id} | Folder: {folder_id[-6:]} | List: {list_id}")
         print(f"{'='*60}")
         
+        # Wait for this file's download, then parse it straight from the temporary file
         try:
-            csv_content = _download_csv(drive_service, file_id)
-            print(f"✅ Downloaded {file_name} ({len(csv_content)} bytes)")
+            csv_text = io.TextIOWrapper(download_future.result(), encoding="utf-8", newline="")
         except Exception as e:
             print(f"❌ Failed to download {file_name}: {e}")
             continue
+        print(f"✅ Downloaded {file_name}")
         
-        # Parse CSV
-        reader = csv.DictReader(io.StringIO(csv_content))
         file_row_count = 0
         file_valid_rows = 0
         file_skipped_rows = 0
+        file_error_rows = 0  # Rows that raised before being queued (never posted)
+        file_complete = False  # Set once every row of the file has been read
         
-        for row_idx, row in enumerate(reader, start=2):  # Start at 2 (header is row 1)
-            # TEST MODE: Only process first 5 rows
-            if RSU_TEST_MODE and rows_processed >= RSU_TEST_MAX_ROWS:
-                print(f"\n⚠️  TEST MODE: Reached max rows ({RSU_TEST_MAX_ROWS}), stopping processing")
-                break
+        # Rows are decoded as they are read, so a bad byte or malformed CSV anywhere in the
+        # file skips the rest of that file only; rows already queued are still posted
+        try:
+            reader = csv.reader(csv_text)
+            map_row = _build_row_mapper(next(reader, None))
+            for row_idx, row in enumerate(reader, start=2):  # Start at 2 (header is row 1)
+                if not row:
+                    continue  # Skip blank lines (as csv.DictReader did)
             
-            file_row_count += 1
-            total_rows += 1
+                # TEST MODE: Only process first 5 rows
+                if RSU_TEST_MODE and rows_processed >= RSU_TEST_MAX_ROWS:
+                    print(f"\n⚠️  TEST MODE: Reached max rows ({RSU_TEST_MAX_ROWS}), stopping processing")
+                    break
             
-            # Progress logging every 100 rows
-            if file_row_count % 100 == 0:
-                elapsed_msg = ""
-                if not DRY_RUN:
-                    print(f"⏳ Progress: Processed {file_row_count} rows from {file_name} (valid: {file_valid_rows}, skipped: {file_skipped_rows})")
-                    if posted_profiles > 0:
-                        print(f"   Posted: {posted_profiles} profiles, {posted_events} events, {subscribed_to_lists} subscriptions")
-                else:
-                    print(f"⏳ Progress: [DRY_RUN] Processed {file_row_count} rows from {file_name} (valid: {file_valid_rows}, skipped: {file_skipped_rows})")
+                file_row_count += 1
+                total_rows += 1
             
-            try:
-                profile_attrs, event_props, registration_ts = _map_row(row)
-                
-                if profile_attrs is None:
-                    skipped_rows += 1
-                    file_skipped_rows += 1
-                    continue
+                # Progress logging every 100 rows
+                if file_row_count % 100 == 0:
+                    elapsed_msg = ""
+                    if not DRY_RUN:
+                        logger.info("⏳ Progress: Processed %d rows from %s (valid: %d, skipped: %d)",
+                                    file_row_count, file_name, file_valid_rows, file_skipped_rows)
+                        if posted_profiles > 0:
+                            logger.info("   Posted: %d profiles, %d events, %d subscriptions",
+                                        posted_profiles, posted_events, subscribed_to_lists)
+                    else:
+                        logger.info("⏳ Progress: [DRY_RUN] Processed %d rows from %s (valid: %d, skipped: %d)",
+                                    file_row_count, file_name, file_valid_rows, file_skipped_rows)
+            
+                try:
+                    # map_row returns the normalized email (before any TEST MODE override)
+                    profile_attrs, event_props, registration_ts, original_email = map_row(row)
                 
-                valid_rows += 1
-                file_valid_rows += 1
-                rows_processed += 1
+                    if profile_attrs is None:
+                        skipped_rows += 1
+                        file_skipped_rows += 1
+                        continue
                 
-                # Get original email before TEST MODE override
-                original_email = _normalize_email(row.get("Email Address", ""))
+                    valid_rows += 1
+                    file_valid_rows += 1
+                    rows_processed += 1
                 
-                # TEST MODE: Override email with test email
-                if RSU_TEST_MODE:
-                    email = RSU_TEST_EMAIL
-                    if detailed_log_count < MAX_DETAILED_LOGS:
-                        print(f"\n🧪 TEST MODE: Overriding email {original_email} → {email}")
-                else:
-                    email = original_email
+                    # TEST MODE: Override email with test email
+                    if RSU_TEST_MODE:
+                        email = RSU_TEST_EMAIL
+                        if detailed_log_count < MAX_DETAILED_LOGS:
+                            logger.info("\n🧪 TEST MODE: Overriding email %s → %s", original_email, email)
+                    else:
+                        email = original_email
                 
-                # ⚡ OPTIMIZATION: Check event deduplication EARLY (before any API calls)
-                # This can skip entire rows if the event was already processed
-                event_key = _generate_event_key(email, event_props, registration_ts)
-                is_duplicate = event_key in processed_event_keys
+                    # ⚡ OPTIMIZATION: Check event deduplication EARLY (before any API calls)
+                    # This can skip entire rows if the event was already processed
+                    event_key = _generate_event_key(email, event_props, registration_ts)
+                    is_duplicate = _event_key_id(event_key) in processed_event_keys
                 
-                if is_duplicate:
-                    skipped_duplicate_events += 1
-                    if detailed_log_count < MAX_DETAILED_LOGS:
-                        print(f"⏭️  Skipping duplicate event for {email} (already processed)")
-                    continue  # Skip entire row - no API calls needed
+                    if is_duplicate:
+                        skipped_duplicate_events += 1
+                        if detailed_log_count < MAX_DETAILED_LOGS:
+                            logger.info("⏭️  Skipping duplicate event for %s (already processed)", email)
+                        continue  # Skip entire row - no API calls needed
                 
-                # Store sample rows for DRY_RUN (first 2 per partner)
-                if DRY_RUN:
-                    if partner_id not in sample_rows_by_partner:
-                        sample_rows_by_partner[partner_id] = []
-                    if len(sample_rows_by_partner[partner_id]) < 2:
-                        sample_rows_by_partner[partner_id].append({
+                    # Store sample rows for DRY_RUN (first 2 per partner); once a partner's
+                    # quota is used up this is a single dict lookup per row
+                    if samples_needed.get(partner_id, 0) > 0:
+                        samples_needed[partner_id] -= 1
+                        sample_rows_by_partner.setdefault(partner_id, []).append({
                             "email": email,
                             "original_email": original_email if RSU_TEST_MODE else email,
                             "profile_attrs": profile_attrs,
@@ -616,119 +1098,94 @@ def process_runsignup_csvs():
                             "partner_id": partner_id,
                             "file_name": file_name
                         })
-                    # Log subscription in DRY_RUN mode
-                    if list_id:
-                        print(f"[DRY_RUN] Would upsert profile {email} and subscribe to list {list_id}")
-                
-                # Skip actual posting if DRY_RUN
-                if DRY_RUN:
-                    continue
                 
-                should_log_detail = detailed_log_count < MAX_DETAILED_LOGS
-                if should_log_detail:
-                    print(f"\n📝 Processing row {row_idx} (email: {email}):")
+                    # Skip actual posting if DRY_RUN
+                    if DRY_RUN:
+                        # Log subscription in DRY_RUN mode (per-row, so DEBUG only)
+                        if list_id:
+                            logger.debug("[DRY_RUN] Would upsert profile %s and subscribe to list %s", email, list_id)
+                        continue
                 
-                # ⚡ OPTIMIZATION: Build profile update payload for batch posting
-                # Use customer_update event type with list subscription included
-                # This is much faster than calling upsert_profile_with_subscription() which does 3 API calls per row
-                # (GET profile + POST profile + POST subscription = 3 calls vs 1 batched call)
-                # Note: Optimizely's API respects existing unsubscribe preferences when using lists field in customer_update events
-                profile_payload = {
-                    "type": "customer_update",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "identifiers": {
-                        "email": email
-                    },
-                    "properties": profile_attrs
-                }
-                
-                # Include list subscription in the payload (Optimizely handles create/update automatically)
-                if list_id:
-                    profile_payload["lists"] = [{"id": list_id, "subscribe": True}]
+                    should_log_detail = detailed_log_count < MAX_DETAILED_LOGS
+                    if should_log_detail:
+                        logger.info("\n📝 Processing row %d (email: %s):", row_idx, email)
                 
-                profile_batch.append(profile_payload)
+                    # Skip the profile update if this registrant is already queued for this list/year
+                    # in the current row group (so it is still posted before this event)
+                    profile_key = (email, list_id, event_props.get("event_year"))
+                    if profile_key in seen_profiles:
+                        skipped_duplicate_profiles += 1
+                    else:
+                        seen_profiles.add(profile_key)
+                        # ⚡ OPTIMIZATION: Build profile update payload for batch posting
+                        # Use customer_update event type with list subscription included
+                        # This is much faster than calling upsert_profile_with_subscription() which does 3 API calls per row
+                        # (GET profile + POST profile + POST subscription = 3 calls vs 1 batched call)
+                        # Note: Optimizely's API respects existing unsubscribe preferences when using lists field in customer_update events
+                        profile_payload = {
+                            "type": "customer_update",
+                            "timestamp": datetime.now(timezone.utc).isoformat(),
+                            "identifiers": {
+                                "email": email
+                            },
+                            "properties": profile_attrs
+                        }
+                        # Include list subscription in the payload (Optimizely handles create/update automatically)
+                        if list_id:
+                            profile_payload["lists"] = [{"id": list_id, "subscribe": True}]
+                        profile_batch.append(profile_payload)
+                        queued_profiles += 1
                 
-                # ⚡ OPTIMIZATION: Post profile batch when it reaches the batch size
-                if len(profile_batch) >= PROFILE_BATCH_SIZE:
-                    try:
-                        status_code, response_text = post_events_batch(profile_batch)
-                        if status_code in (200, 202):
-                            posted_profiles += len(profile_batch)
-                            subscribed_to_lists += len(profile_batch)  # All profiles in batch include subscription
-                            if detailed_log_count <= MAX_DETAILED_LOGS:
-                                print(f"   Profiles: Posted batch of {len(profile_batch)} profile updates")
-                        else:
-                            print(f"⚠️ Profile batch post failed: {status_code} - {response_text[:200]}")
-                        profile_batch = []  # Clear batch
-                    except Exception as e:
-                        print(f"❌ Error posting profile batch: {e}")
-                        profile_batch = []  # Clear batch on error
+                    # ⚡ OPTIMIZATION: Collect event for batch posting (already checked for duplicates above)
+                    # Mark as processed immediately to avoid race conditions
+                    new_event_keys.add(event_key)
                 
-                # ⚡ OPTIMIZATION: Collect event for batch posting (already checked for duplicates above)
-                # Mark as processed immediately to avoid race conditions
-                new_event_keys.add(event_key)
+                    # Build event payload for batch
+                    event_payload = {
+                        "type": OPTIMIZELY_EVENT_NAME,
+                        "timestamp": registration_ts or datetime.now(timezone.utc).isoformat(),
+                        "identifiers": {
+                            "email": email
+                        },
+                        "properties": event_props
+                    }
+                    event_batch.append(event_payload)
+                    queued_events += 1
                 
-                # Build event payload for batch
-                event_payload = {
-                    "type": OPTIMIZELY_EVENT_NAME,
-                    "timestamp": registration_ts or datetime.now(timezone.utc).isoformat(),
-                    "identifiers": {
-                        "email": email
-                    },
-                    "properties": event_props
-                }
-                event_batch.append(event_payload)
+                    # ⚡ OPTIMIZATION: Post the row group (profiles, then events) when a batch is full
+                    if len(profile_batch) >= PROFILE_BATCH_SIZE or len(event_batch) >= EVENT_BATCH_SIZE:
+                        pending_posts.append(post_executor.submit(_post_row_batches, profile_batch, event_batch, ""))
+                        profile_batch = []  # Start new batches (the submitted ones are owned by the worker)
+                        event_batch = []
+                        seen_profiles.clear()
                 
-                # Post batch when it reaches the batch size
-                if len(event_batch) >= EVENT_BATCH_SIZE:
-                    try:
-                        status_code, response_text = post_events_batch(event_batch)
-                        if status_code in (200, 202):
-                            posted_events += len(event_batch)
-                            if detailed_log_count <= MAX_DETAILED_LOGS:
-                                print(f"   Events: Posted batch of {len(event_batch)} events")
-                        else:
-                            print(f"⚠️ Event batch post failed: {status_code} - {response_text[:200]}")
-                        event_batch = []  # Clear batch
-                    except Exception as e:
-                        print(f"❌ Error posting event batch: {e}")
-                        event_batch = []  # Clear batch on error
+                    # Apply backpressure and collect results of completed posts
+                    if len(pending_posts) > MAX_PENDING_POSTS:
+                        accepted_profiles, accepted_events = _wait_for_posts(pending_posts, MAX_PENDING_POSTS)
+                        posted_profiles += accepted_profiles
+                        subscribed_to_lists += accepted_profiles  # All profiles in batch include subscription
+                        posted_events += accepted_events
                 
-                detailed_log_count += 1
+                    detailed_log_count += 1
                     
-            except Exception as e:
-                print(f"❌ Error processing row {row_idx} in {file_name}: {e}")
-                skipped_rows += 1
-                continue
-        
-        # ⚡ OPTIMIZATION: Flush any remaining profile updates in batch at end of file
-        if profile_batch and not DRY_RUN:
-            try:
-                status_code, response_text = post_events_batch(profile_batch)
-                if status_code in (200, 202):
-                    posted_profiles += len(profile_batch)
-                    subscribed_to_lists += len(profile_batch)
-                    print(f"   Profiles: Posted final batch of {len(profile_batch)} profile updates")
-                else:
-                    print(f"⚠️ Final profile batch post failed: {status_code} - {response_text[:200]}")
-                profile_batch = []  # Clear batch
-            except Exception as e:
-                print(f"❌ Error posting final profile batch: {e}")
-                profile_batch = []  # Clear batch on error
+                except Exception as e:
+                    logger.error("❌ Error processing row %d in %s: %s", row_idx, file_name, e)
+                    skipped_rows += 1
+                    file_error_rows += 1
+                    continue
+            else:
+                file_complete = True
+        except (UnicodeDecodeError, csv.Error) as e:
+            print(f"❌ Could not read {file_name} after {file_row_count} rows, skipping the rest of the file: {e}")
+        finally:
+            csv_text.close()  # Deletes the temporary download file
         
-        # ⚡ OPTIMIZATION: Flush any remaining events in batch at end of file
-        if event_batch and not DRY_RUN:
-            try:
-                status_code, response_text = post_events_batch(event_batch)
-                if status_code in (200, 202):
-                    posted_events += len(event_batch)
-                    print(f"   Events: Posted final batch of {len(event_batch)} events")
-                else:
-                    print(f"⚠️ Final event batch post failed: {status_code} - {response_text[:200]}")
-                event_batch = []  # Clear batch
-            except Exception as e:
-                print(f"❌ Error posting final event batch: {e}")
-                event_batch = []  # Clear batch on error
+        # ⚡ OPTIMIZATION: Flush any remaining profile updates and events at end of file
+        if (profile_batch or event_batch) and not DRY_RUN:
+            pending_posts.append(post_executor.submit(_post_row_batches, profile_batch, event_batch, "final "))
+            profile_batch = []
+            event_batch = []
+            seen_profiles.clear()
         
         # Log file processing summary
         print(f"\n✅ Completed {file_name}:")
@@ -746,35 +1203,33 @@ def process_runsignup_csvs():
             "valid_rows": file_valid_rows,
             "skipped_rows": file_skipped_rows
         })
-    
-    # ⚡ OPTIMIZATION: Flush any remaining profile updates in batch after all files
-    if profile_batch and not DRY_RUN:
-        try:
-            status_code, response_text = post_events_batch(profile_batch)
-            if status_code in (200, 202):
-                posted_profiles += len(profile_batch)
-                subscribed_to_lists += len(profile_batch)
-                print(f"\n📦 Posted final batch of {len(profile_batch)} profile updates")
+        
+        # Record the synced file so unchanged files are skipped next run (live full runs
+        # only). Rows that errored or were never read were not queued, so such files are retried
+        if not DRY_RUN and not RSU_TEST_MODE:
+            if not file_complete:
+                print(f"   ⚠️ {file_name} was not read to the end; not marking it as synced")
+            elif file_error_rows:
+                print(f"   ⚠️ {file_error_rows} row(s) failed; not marking {file_name} as synced")
             else:
-                print(f"\n⚠️ Final profile batch post failed: {status_code} - {response_text[:200]}")
-            profile_batch = []  # Clear batch
-        except Exception as e:
-            print(f"\n❌ Error posting final profile batch: {e}")
-            profile_batch = []  # Clear batch on error
+                synced_files[folder_id] = {
+                    "id": file_info["id"],
+                    "modifiedTime": file_info.get("modifiedTime", "")
+                }
     
-    # ⚡ OPTIMIZATION: Flush any remaining events in batch after all files
-    if event_batch and not DRY_RUN:
-        try:
-            status_code, response_text = post_events_batch(event_batch)
-            if status_code in (200, 202):
-                posted_events += len(event_batch)
-                print(f"\n📦 Posted final batch of {len(event_batch)} events")
-            else:
-                print(f"\n⚠️ Final event batch post failed: {status_code} - {response_text[:200]}")
-            event_batch = []  # Clear batch
-        except Exception as e:
-            print(f"\n❌ Error posting final event batch: {e}")
-            event_batch = []  # Clear batch on error
+    # ⚡ OPTIMIZATION: Flush any remaining profile updates and events after all files
+    if (profile_batch or event_batch) and not DRY_RUN:
+        pending_posts.append(post_executor.submit(_post_row_batches, profile_batch, event_batch, "final "))
+        profile_batch = []
+        event_batch = []
+        seen_profiles.clear()
+    
+    # Wait for all in-flight batch posts before reporting
+    accepted_profiles, accepted_events = _wait_for_posts(pending_posts)
+    posted_profiles += accepted_profiles
+    subscribed_to_lists += accepted_profiles
+    posted_events += accepted_events
+    post_executor.shutdown()
     
     # Print summary
     print("\n" + "=" * 60)
@@ -795,18 +1250,22 @@ def process_runsignup_csvs():
         print(f"  Posted profiles: {posted_profiles}")
         print(f"  Posted events: {posted_events}")
         print(f"  Skipped duplicate events: {skipped_duplicate_events}")
+        print(f"  Skipped duplicate profile updates: {skipped_duplicate_profiles}")
         print(f"  Subscribed to lists: {subscribed_to_lists}")
         
-        # Save processed events for next run (preserve existing + add new)
-        updated_keys = processed_event_keys.union(new_event_keys)
+        # Append this run's new event keys to the deduplication log
         if new_event_keys:
-            save_processed_events(updated_keys)
+            append_processed_events(new_event_keys)
             print(f"\n💾 Saved {len(new_event_keys)} new event keys to deduplication log")
-            print(f"   Total tracked events: {len(updated_keys)}")
-        elif len(processed_event_keys) > 0:
-            # Even if no new events, save to preserve existing tracked events
-            save_processed_events(updated_keys)
-            print(f"\n💾 Preserved {len(processed_event_keys)} existing tracked events")
+            # New keys were checked against processed_event_keys, so the sets are disjoint
+            print(f"   Total tracked events: {len(processed_event_keys) + len(new_event_keys)}")
+        
+        # Only advance synced-file cursors if every queued profile and event was accepted
+        if not RSU_TEST_MODE:
+            if posted_profiles == queued_profiles and posted_events == queued_events:
+                save_synced_files(synced_files)
+            else:
+                print(f"\n⚠️ Some batches failed; not marking files as synced so they are retried next run")
     
     if RSU_TEST_MODE:
         print(f"\n⚠️  TEST MODE was enabled - only processed {rows_processed} rows with email override to {RSU_TEST_EMAIL}")
@@ -821,12 +1280,8 @@ def process_runsignup_csvs():
             # Get list_id from first sample (all samples from same partner have same list_id)
             list_id = samples[0].get('list_id', 'N/A') if samples else 'N/A'
             print(f"\n  Partner {partner_id} (List: {list_id}):")
-            for i, sample in enumerate(samples, 1):
-                print(f"\n    Row {i} from {sample.get('file_name', 'unknown')}:")
-                print(f"      Email: {sample['email']}")
-                print(f"      Profile attrs: {json.dumps(sample['profile_attrs'], indent=8)}")
-                print(f"      Event props: {json.dumps(sample['event_props'], indent=8)}")
-                print(f"      Timestamp: {sample['timestamp']}")
+            # Serialize all samples for the partner in one pass
+            print(json.dumps(samples, indent=2))
     
     # Return rows_processed for main script to use
     return rows_processed
@@ -2,17 +2,30 @@ import os
 import sys
 import csv
 import json
-import time
 import logging
+import shutil
 import argparse
+import functools
+import itertools
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Optional faster JSON decoder (falls back to requests' stdlib json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Optional GDrive uploader (won't crash if missing)
 UPLOAD_AVAILABLE = False
 try:
-    from upload_to_gdrive import upload_to_drive  # scripts/ same folder
+    from upload_to_gdrive import upload_to_drive, upload_files_to_drive  # scripts/ same folder
     UPLOAD_AVAILABLE = True
 except Exception:
     pass
@@ -27,8 +40,40 @@ logger = logging.getLogger("rics_diag")
 # ---------- Config from ENV / args ----------
 DEFAULT_STORE_CODES = [1,2,3,4,6,7,8,9,10,11,12,21,22,98,99]
 
+@functools.lru_cache(maxsize=1)
+def _get_token():
+    """RICS_API_TOKEN from the environment, read once per process."""
+    return (os.getenv("RICS_API_TOKEN") or "").strip()
+
+@functools.lru_cache(maxsize=1)
+def _get_store_codes():
+    """Store codes from RICS_STORE_CODES (or the default list), parsed once per process."""
+    env_codes = (os.getenv("RICS_STORE_CODES") or "").strip()
+    if env_codes:
+        try:
+            return tuple(int(x.strip()) for x in env_codes.split(",") if x.strip())
+        except Exception:
+            logger.warning("Failed to parse RICS_STORE_CODES; using fallback list.")
+    return tuple(DEFAULT_STORE_CODES)
+
 ENTERPRISE_URL = "https://enterprise.ricssoftware.com/api/POS/GetPOSTransaction"
 PUBLIC_URL     = "https://api.ricssoftware.com/pos/GetPOSTransaction"
+ENDPOINT_NAME  = {ENTERPRISE_URL: "enterprise", PUBLIC_URL: "public"}
+
+# Shared keep-alive session; 429/5xx responses are retried with backoff (honoring
+# Retry-After). GetPOSTransaction is a read, so retrying the POST is safe.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    ),
+))
 
 AUTH_STYLES = ("token", "bearer")       # try both
 DATE_PARAM_STYLES = ("ticket", "sale")  # try both
@@ -38,37 +83,29 @@ CSV_FIELDS = [
     "AccountNumber","CustomerId","Sku","Description","Quantity","AmountPaid","Discount",
     "Department","SupplierName"
 ]
+_FIELD_GETTER = operator.itemgetter(*CSV_FIELDS)
 
-# ---------- Helpers ----------
-def parse_dt(dt_str):
-    if not dt_str:
-        return None
-    fmts = (
-        "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%fZ",
-        "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M"
-    )
-    for fmt in fmts:
-        try:
-            return datetime.strptime(dt_str, fmt)
-        except Exception:
-            continue
-    return None
+# America/New_York zone, resolved once (None if zoneinfo/tzdata is unavailable)
+try:
+    from zoneinfo import ZoneInfo
+    _ET = ZoneInfo("America/New_York")
+except Exception:
+    _ET = None
 
+# ---------- Helpers ----------
 def zone_aware_window(days):
     """Return two windows: pure UTC and ET->UTC converted."""
     now_utc = datetime.now(timezone.utc)
     start_utc = now_utc - timedelta(days=days)
 
     # America/New_York local interpretation, then convert to UTC string for API
-    try:
-        from zoneinfo import ZoneInfo
-        et = ZoneInfo("America/New_York")
-        now_et = datetime.now(et)
+    if _ET is not None:
+        now_et = now_utc.astimezone(_ET)
         start_et = now_et - timedelta(days=days)
         # Convert local ET moments to UTC timestamps
         start_et_as_utc = start_et.astimezone(timezone.utc)
         now_et_as_utc = now_et.astimezone(timezone.utc)
-    except Exception:
+    else:
         # Fallback: just use UTC window twice if zoneinfo missing
         start_et_as_utc = start_utc
         now_et_as_utc = now_utc
@@ -107,8 +144,7 @@ def extract_sales(json_obj):
 
 def sale_to_rows(sale, already_seen):
     rows = []
-    sale_dt = parse_dt(sale.get("TicketDateTime") or sale.get("SaleDateTime"))
-    # We filter by API window; no need to re-filter here except for sanity
+    # We filter by API window; no need to re-parse the sale date here
     sale_info = {
         "TicketDateTime": sale.get("TicketDateTime"),
         "TicketNumber": sale.get("TicketNumber"),
@@ -120,7 +156,7 @@ def sale_to_rows(sale, already_seen):
         "CustomerId": sale.get("CustomerId"),
     }
     for item in sale.get("SaleLines", []) or []:
-        key = f"{sale_info.get('TicketNumber')}_{item.get('Sku')}"
+        key = (sale_info["TicketNumber"], item.get("Sku"))
         if key in already_seen:
             continue
         already_seen.add(key)
@@ -138,28 +174,42 @@ def sale_to_rows(sale, already_seen):
 
 def write_csv(path, rows, headers=CSV_FIELDS):
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Rows from sale_to_rows carry every header, so one C-level itemgetter call
+    # produces each output tuple; rows missing a key fall back to .get()
+    getter = _FIELD_GETTER if headers is CSV_FIELDS else operator.itemgetter(*headers)
+
+    def values(r):
+        try:
+            return getter(r)
+        except KeyError:
+            return tuple(r.get(k) for k in headers)
+
     with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=headers)
-        w.writeheader()
-        for r in rows:
-            w.writerow({k: r.get(k) for k in headers})
+        w = csv.writer(f)
+        w.writerow(headers)
+        w.writerows(map(values, rows))
+
+def link_or_copy(src, dst):
+    """Hardlink dst to src (one inode op), copying instead across devices.
+
+    dst is removed first so an older link from a previous run is replaced,
+    not truncated in place.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
 
 # ---------- Main diagnostic fetch ----------
-def diagnose_and_fetch(days, pages, per_page, debug, limit_stores):
-    token = (os.getenv("RICS_API_TOKEN") or "").strip()
+def diagnose_and_fetch(days, pages, per_page, debug, limit_stores, workers=8):
+    token = _get_token()
     if not token:
         logger.error("Missing RICS_API_TOKEN")
         sys.exit(1)
 
-    env_codes = (os.getenv("RICS_STORE_CODES") or "").strip()
-    if env_codes:
-        try:
-            store_codes = [int(x.strip()) for x in env_codes.split(",") if x.strip()]
-        except Exception:
-            logger.warning("Failed to parse RICS_STORE_CODES; using fallback list.")
-            store_codes = DEFAULT_STORE_CODES[:]
-    else:
-        store_codes = DEFAULT_STORE_CODES[:]
+    store_codes = list(_get_store_codes())
 
     if limit_stores:
         store_codes = store_codes[:limit_stores]
@@ -172,113 +222,138 @@ def diagnose_and_fetch(days, pages, per_page, debug, limit_stores):
     endpoints = [ENTERPRISE_URL, PUBLIC_URL]
     date_windows = [("utc", utc_win), ("et_to_utc", et_win)]
 
-    results_rows = []
-    seen = set()
-
-    # Summary tracker
-    tried_matrix = {}  # store_code -> list of tuples with outcome
+    # Every (endpoint, auth, date style, window) combination, most recently successful first
+    combos = list(itertools.product(endpoints, AUTH_STYLES, DATE_PARAM_STYLES, date_windows))
+    combos_lock = threading.Lock()
 
-    for store in store_codes:
-        tried_matrix[store] = []
+    def probe_store(store):
+        """Find the first working combo for one store; returns (rows, outcomes)."""
+        store_rows = []
+        outcomes = []
+        seen = set()  # Per-store; rows are deduped across stores when merged below
         store_success = False
 
-        for endpoint in endpoints:
-            for auth_style in AUTH_STYLES:
-                headers = build_headers(auth_style, token)
-
-                for date_style in DATE_PARAM_STYLES:
-                    for win_name, (start, end) in date_windows:
-
-                        page = 0
-                        skip = 0
-                        collected_for_combo = 0
-                        error_text = None
-
-                        while page < pages:
-                            payload = build_payload(store, skip, per_page, date_style, start, end)
-                            try:
-                                if debug:
-                                    logger.info(f"[TRY] store={store} ep={'enterprise' if endpoint==ENTERPRISE_URL else 'public'} "
-                                                f"auth={auth_style} date={date_style}/{win_name} page={page+1} "
-                                                f"payload={payload}")
-
-                                resp = requests.post(endpoint, headers=headers, json=payload, timeout=45)
-                                status = resp.status_code
-                                ctype = resp.headers.get("Content-Type","")
-                                body = resp.text
-
-                                if status >= 400:
-                                    # Capture a short body excerpt for diagnosis
-                                    excerpt = body[:600].replace("\n"," ")
-                                    logger.warning(f"[{status}] store={store} ep={endpoint} auth={auth_style} "
-                                                   f"date={date_style}/{win_name} page={page+1} "
-                                                   f"ctype={ctype} excerpt={excerpt}")
-                                    error_text = f"HTTP {status}"
-                                    break
-
-                                # Try JSON parse
-                                try:
-                                    data = resp.json()
-                                except Exception as je:
-                                    excerpt = body[:600].replace("\n"," ")
-                                    logger.warning(f"[JSON?] store={store} parse error: {je}; excerpt={excerpt}")
-                                    error_text = "Invalid JSON"
-                                    break
-
-                                # Dump raw keys in debug mode
-                                if debug:
-                                    logger.info(f"Top-level keys: {list(data.keys()) if isinstance(data, dict) else type(data)}")
-
-                                sales = extract_sales(data)
-                                if debug:
-                                    logger.info(f"Sales len={len(sales)}")
-
-                                if not sales:
-                                    # No data on this page; stop paging this combo
-                                    break
-
-                                # Convert to rows
-                                page_rows = []
-                                for sale in sales:
-                                    page_rows.extend(sale_to_rows(sale, seen))
-                                collected_for_combo += len(page_rows)
-                                results_rows.extend(page_rows)
-
-                                # paging
-                                if len(sales) < per_page:
-                                    break
-                                page += 1
-                                skip += per_page
-                                time.sleep(0.2)
-
-                            except requests.exceptions.RequestException as rexc:
-                                logger.error(f"Request error store={store}: {rexc}")
-                                error_text = str(rexc)
-                                break
-                            except Exception as ex:
-                                logger.error(f"Unexpected error store={store}: {ex}")
-                                error_text = str(ex)
-                                break
-
-                        # record outcome for this combo
-                        tried_matrix[store].append({
-                            "endpoint": ("enterprise" if endpoint==ENTERPRISE_URL else "public"),
-                            "auth": auth_style,
-                            "date": f"{date_style}/{win_name}",
-                            "rows": collected_for_combo,
-                            "error": error_text
-                        })
-
-                        if collected_for_combo > 0:
-                            store_success = True
-                            # Use first working combo per store to avoid duplicates
-                            break
-                    if store_success: break
-                if store_success: break
-            if store_success: break
+        with combos_lock:
+            ordered_combos = list(combos)
+
+        for combo in ordered_combos:
+            endpoint, auth_style, date_style, (win_name, (start, end)) = combo
+            headers = build_headers(auth_style, token)
+
+            page = 0
+            skip = 0
+            collected_for_combo = 0
+            error_text = None
+            # Only Skip changes between pages; reuse one payload per combo
+            payload = build_payload(store, skip, per_page, date_style, start, end)
+
+            while page < pages:
+                payload["Skip"] = skip
+                try:
+                    if debug:
+                        logger.info(f"[TRY] store={store} ep={ENDPOINT_NAME[endpoint]} "
+                                    f"auth={auth_style} date={date_style}/{win_name} page={page+1} "
+                                    f"payload={payload}")
+
+                    # Streamed so error pages are never decoded beyond the excerpt
+                    resp = SESSION.post(endpoint, headers=headers, json=payload, timeout=45, stream=True)
+                    status = resp.status_code
+                    ctype = resp.headers.get("Content-Type","")
+
+                    if status >= 400:
+                        # Capture a short body excerpt for diagnosis
+                        excerpt = resp.raw.read(600, decode_content=True).decode("utf-8", "replace").replace("\n"," ")
+                        resp.close()
+                        logger.warning(f"[{status}] store={store} ep={endpoint} auth={auth_style} "
+                                       f"date={date_style}/{win_name} page={page+1} "
+                                       f"ctype={ctype} excerpt={excerpt}")
+                        error_text = f"HTTP {status}"
+                        break
+
+                    # Try JSON parse
+                    try:
+                        # orjson decodes the raw bytes directly (no str decode first)
+                        data = orjson.loads(resp.content) if orjson else resp.json()
+                    except Exception as je:
+                        excerpt = resp.text[:600].replace("\n"," ")
+                        logger.warning(f"[JSON?] store={store} parse error: {je}; excerpt={excerpt}")
+                        error_text = "Invalid JSON"
+                        break
+
+                    # Dump raw keys in debug mode
+                    if debug:
+                        logger.info(f"Top-level keys: {list(data.keys()) if isinstance(data, dict) else type(data)}")
+
+                    sales = extract_sales(data)
+                    if debug:
+                        logger.info(f"Sales len={len(sales)}")
+
+                    if not sales:
+                        # No data on this page; stop paging this combo
+                        break
+
+                    # Convert to rows
+                    page_rows = []
+                    for sale in sales:
+                        page_rows.extend(sale_to_rows(sale, seen))
+                    collected_for_combo += len(page_rows)
+                    store_rows.extend(page_rows)
+
+                    # paging
+                    if len(sales) < per_page:
+                        break
+                    page += 1
+                    skip += per_page
+
+                except requests.exceptions.RequestException as rexc:
+                    logger.error(f"Request error store={store}: {rexc}")
+                    error_text = str(rexc)
+                    break
+                except Exception as ex:
+                    logger.error(f"Unexpected error store={store}: {ex}")
+                    error_text = str(ex)
+                    break
+
+            # record outcome for this combo
+            outcomes.append({
+                "endpoint": ENDPOINT_NAME[endpoint],
+                "auth": auth_style,
+                "date": f"{date_style}/{win_name}",
+                "rows": collected_for_combo,
+                "error": error_text
+            })
+
+            if collected_for_combo > 0:
+                store_success = True
+                # Use first working combo per store to avoid duplicates; try it first
+                # for the next store, since stores usually share a working combo
+                with combos_lock:
+                    if combos[0] is not combo:
+                        combos.remove(combo)
+                        combos.insert(0, combo)
+                break
 
         if not store_success and debug:
             logger.warning(f"Store {store}: no rows with any combo.")
+        return store_rows, outcomes
+
+    results_rows = []
+    seen = set()
+
+    # Summary tracker
+    tried_matrix = {}  # store_code -> list of tuples with outcome
+
+    # Stores are independent and I/O-bound, so probe them concurrently; results are
+    # merged in store order so output matches a sequential run
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for store, (store_rows, outcomes) in zip(store_codes, executor.map(probe_store, store_codes)):
+            tried_matrix[store] = outcomes
+            for r in store_rows:
+                k = (r["TicketNumber"], r["Sku"])
+                if k in seen:
+                    continue
+                seen.add(k)
+                results_rows.append(r)
 
     # ---------- Write outputs ----------
     ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
@@ -288,20 +363,14 @@ def diagnose_and_fetch(days, pages, per_page, debug, limit_stores):
     dedup = "rics_customer_purchase_history_deduped.csv"
 
     if results_rows:
-        write_csv(os.path.join(out_dir, base_ts), results_rows)
-        write_csv(os.path.join(out_dir, latest), results_rows)
-
-        # Dedup by TicketNumber+Sku
-        dd_seen = set()
-        dedup_rows = []
-        for r in results_rows:
-            k = f"{r.get('TicketNumber')}_{r.get('Sku')}"
-            if k in dd_seen:
-                continue
-            dd_seen.add(k)
-            dedup_rows.append(r)
-        write_csv(os.path.join(out_dir, dedup), dedup_rows)
-        logger.info(f"Final counts → raw: {len(results_rows)}, deduped: {len(dedup_rows)}")
+        base_path = os.path.join(out_dir, base_ts)
+        write_csv(base_path, results_rows)
+
+        # results_rows is already unique by TicketNumber+Sku (deduped as stores are
+        # merged), so the latest and deduped outputs are links to the same file
+        link_or_copy(base_path, os.path.join(out_dir, latest))
+        link_or_copy(base_path, os.path.join(out_dir, dedup))
+        logger.info(f"Final counts → raw: {len(results_rows)}, deduped: {len(results_rows)}")
     else:
         # EMPTY marker with reason
         empty = base_ts.replace(".csv", "_EMPTY.csv")
@@ -319,9 +388,8 @@ def diagnose_and_fetch(days, pages, per_page, debug, limit_stores):
     if UPLOAD_AVAILABLE:
         try:
             if results_rows:
-                upload_to_drive(base_ts)
-                upload_to_drive(latest)
-                upload_to_drive(dedup)
+                # Independent artifacts: upload them in parallel
+                upload_files_to_drive([base_ts, latest, dedup])
             else:
                 upload_to_drive(empty)
         except Exception as ue:
@@ -341,6 +409,7 @@ def main():
     p.add_argument("--per-page", type=int, default=100, help="Take/page size (default: 100)")
     p.add_argument("--debug", action="store_true", help="Verbose debug logging")
     p.add_argument("--limit-stores", type=int, default=0, help="Limit number of stores for faster debug")
+    p.add_argument("--workers", type=int, default=8, help="Stores probed in parallel (default: 8)")
     args = p.parse_args()
 
     if args.debug:
@@ -351,7 +420,8 @@ def main():
         pages=args.pages,
         per_page=args.per_page,
         debug=args.debug,
-        limit_stores=args.limit_stores if args.limit_stores > 0 else None
+        limit_stores=args.limit_stores if args.limit_stores > 0 else None,
+        workers=args.workers
     )
 
 if __name__ == "__main__":
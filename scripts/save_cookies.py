@@ -1,25 +1,18 @@
 import os
 import json
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-
-EMAIL = os.environ.get("RUNSIGNUP_EMAIL")
-PASSWORD = os.environ.get("RUNSIGNUP_PASSWORD")
-
-if not EMAIL or not PASSWORD:
-    raise EnvironmentError("❌ RUNSIGNUP_EMAIL or RUNSIGNUP_PASSWORD not set in environment.")
 
 DOWNLOAD_DIR = os.path.join(os.getcwd(), "optimizely_connector", "output")
 COOKIE_PATH = os.path.join(DOWNLOAD_DIR, "runsignup_cookies.json")
 LOGIN_URL = "https://runsignup.com/Login"
 
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+# Selenium and the credential check are deferred to save_cookies() so that
+# importing this module stays cheap and side-effect free.
 
 def setup_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     options = Options()
     options.add_argument("--headless=new")
     options.add_argument("--no-sandbox")
@@ -27,13 +20,24 @@ def setup_driver():
     return webdriver.Chrome(options=options)
 
 def save_cookies():
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    email = os.environ.get("RUNSIGNUP_EMAIL")
+    password = os.environ.get("RUNSIGNUP_PASSWORD")
+
+    if not email or not password:
+        raise EnvironmentError("❌ RUNSIGNUP_EMAIL or RUNSIGNUP_PASSWORD not set in environment.")
+
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
     driver = setup_driver()
     try:
         driver.get(LOGIN_URL)
 
         WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.NAME, "email")))
-        driver.find_element(By.NAME, "email").send_keys(EMAIL)
-        driver.find_element(By.NAME, "password").send_keys(PASSWORD)
+        driver.find_element(By.NAME, "email").send_keys(email)
+        driver.find_element(By.NAME, "password").send_keys(password)
 
         # Wait for the login button and click it via JS to avoid interception
         WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.XPATH, "//button[@type='submit']")))
@@ -2,10 +2,9 @@ import os, sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from datetime import datetime, timedelta
-import requests
 import json
 import argparse
-from rics_connector.fetch_rics_data import fetch_rics_data_with_purchase_history
+from rics_connector.fetch_rics_data import SESSION, fetch_rics_data_with_purchase_history
 from scripts.helpers import log_message
 
 def main():
@@ -57,7 +56,8 @@ def main():
     try:
         log_message(f"🔍 Testing API endpoint: {url}")
         log_message(f"🔍 Date range: {start_date} to {end_date}")
-        resp = requests.post(url, headers={"Token": token}, json=test_payload, timeout=30)
+        # Shared session: the store fetches below reuse this warm connection
+        resp = SESSION.post(url, headers={"Token": token}, json=test_payload, timeout=30)
         log_message(f"📊 API Response: {resp.status_code}")
         
         if resp.status_code == 401:
@@ -165,10 +165,9 @@ def main():
     # Upload to Google Drive (optional)
     log_message("=== UPLOADING TO GOOGLE DRIVE ===")
     try:
-        from scripts.upload_to_gdrive import upload_to_drive
-        upload_to_drive(output_path)
-        if not args.no_dedup:
-            upload_to_drive(deduped_path)
+        from scripts.upload_to_gdrive import upload_files_to_drive
+        # Raw and deduped files are independent; upload them in parallel
+        upload_files_to_drive([output_path] if args.no_dedup else [output_path, deduped_path])
         log_message("✅ Successfully uploaded files to Google Drive")
     except Exception as e:
         log_message(f"⚠️ Google Drive upload skipped: {e}")
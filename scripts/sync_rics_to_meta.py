@@ -6,8 +6,15 @@ import requests
 import re
 import json
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 
+# Optional faster JSON encoder for batch bodies (falls back to stdlib json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # =========================
 # Config
 # =========================
@@ -16,8 +23,13 @@ ACCESS_TOKEN = os.getenv("META_ACCESS_TOKEN")
 API_URL = f"https://graph.facebook.com/v19.0/{DATASET_ID}/events"
 HEADERS = {"Content-Type": "application/json"}
 
+# One keep-alive session for all batches instead of a new TLS handshake per POST
+SESSION = requests.Session()
+
 INPUT_CSV_PATH = os.getenv("RICS_INPUT_CSV", "rics_customer_purchase_history_deduped.csv")
 BATCH_SIZE = 100
+# Batches posted concurrently; each batch is independent on Meta's side
+POST_WORKERS = max(1, int(os.getenv("META_POST_WORKERS", "4")))
 CURRENCY = "USD"
 COUNTRY_DEFAULT = "US"
 
@@ -93,8 +105,11 @@ def build_events_from_csv(csv_path: str) -> list[dict]:
 
     with open(csv_path, mode="r", encoding="utf-8-sig", newline="") as f:
         reader = csv.DictReader(f)
+        # Exports from fetch_rics_data carry no void/suspend columns; only pay
+        # for the per-row flag parsing when the file actually has them
+        has_flags = bool({"TicketVoided", "TicketSuspended"} & set(reader.fieldnames or ()))
         for row in reader:
-            if booly(row.get("TicketVoided")) or booly(row.get("TicketSuspended")):
+            if has_flags and (booly(row.get("TicketVoided")) or booly(row.get("TicketSuspended"))):
                 continue
             ticket_no = (row.get("TicketNumber") or "").strip()
             if not ticket_no:
@@ -103,6 +118,9 @@ def build_events_from_csv(csv_path: str) -> list[dict]:
 
     events = []
     skip_reasons = {"old": 0, "zero_value": 0, "flags": 0, "missing_keys": 0}
+    # Same for every ticket: hash/convert once instead of per event
+    country_hash = sha256_norm(COUNTRY_DEFAULT)
+    cutoff_utc = cutoff_time.replace(tzinfo=timezone.utc)
     
     # Initialize counters for logging
     action_source_counts = {"offline": 0, "website": 0, "other": 0}
@@ -122,10 +140,10 @@ def build_events_from_csv(csv_path: str) -> list[dict]:
         
         # Debug: Log first few events and their dates
         if len(events) < 3:
-            print(f"🔍 DEBUG: Event date: {event_dt}, Cutoff: {cutoff_time.replace(tzinfo=timezone.utc)}")
-            print(f"🔍 DEBUG: Event is {'OLD' if event_dt < cutoff_time.replace(tzinfo=timezone.utc) else 'RECENT'}")
+            print(f"🔍 DEBUG: Event date: {event_dt}, Cutoff: {cutoff_utc}")
+            print(f"🔍 DEBUG: Event is {'OLD' if event_dt < cutoff_utc else 'RECENT'}")
         
-        if event_dt < cutoff_time.replace(tzinfo=timezone.utc):
+        if event_dt < cutoff_utc:
             skip_reasons["old"] += 1
             continue
 
@@ -159,19 +177,26 @@ def build_events_from_csv(csv_path: str) -> list[dict]:
         if len(name_parts) < 2:
             name_parts.extend([""] * (2 - len(name_parts)))
         
-        user_data = {
-            "em": sha256_norm(first.get("CustomerEmail")),
-            "ph": sha256_phone(first.get("CustomerPhone")),
-            "fn": sha256_norm(name_parts[0]),  # First name
-            "ln": sha256_norm(name_parts[1]),  # Last name
-            "ct": sha256_norm(first.get("City")),
-            "st": sha256_norm(first.get("State")),
-            "zp": sha256_norm(str(first.get("ZipCode") or "")),
-            "country": sha256_norm(COUNTRY_DEFAULT),
-            "external_id": sha256_norm(first.get("CustomerId")),
-        }
-        # Remove None values
-        user_data = {k: v for k, v in user_data.items() if v}
+        # Only non-empty hashes are inserted (no build-then-filter pass)
+        user_data = {}
+        if em := sha256_norm(first.get("CustomerEmail")):
+            user_data["em"] = em
+        if ph := sha256_phone(first.get("CustomerPhone")):
+            user_data["ph"] = ph
+        if fn := sha256_norm(name_parts[0]):  # First name
+            user_data["fn"] = fn
+        if ln := sha256_norm(name_parts[1]):  # Last name
+            user_data["ln"] = ln
+        if ct := sha256_norm(first.get("City")):
+            user_data["ct"] = ct
+        if st := sha256_norm(first.get("State")):
+            user_data["st"] = st
+        if zp := sha256_norm(str(first.get("ZipCode") or "")):
+            user_data["zp"] = zp
+        if country_hash:
+            user_data["country"] = country_hash
+        if external_id := sha256_norm(first.get("CustomerId")):
+            user_data["external_id"] = external_id
         
         # Debug: Log customer data for first few events
         if len(events) < 3:
@@ -256,21 +281,20 @@ def send_batch(events: list[dict]) -> None:
         "upload_tag": upload_tag
     }
     
-    resp = requests.post(API_URL, headers=HEADERS, json=payload, timeout=60)
+    body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode("utf-8")
+    resp = SESSION.post(API_URL, headers=HEADERS, data=body, timeout=60)
     if resp.ok:
         print(f"✅ Sent batch of {len(events)} events with upload_tag: {upload_tag}")
     else:
         print(f"❌ Failed batch ({resp.status_code}) → {resp.text}")
 
 def send_in_batches(all_events: list[dict], batch_size: int = BATCH_SIZE) -> None:
-    batch = []
-    for ev in all_events:
-        batch.append(ev)
-        if len(batch) >= batch_size:
-            send_batch(batch)
-            batch = []
-    if batch:
-        send_batch(batch)
+    batches = [all_events[i:i + batch_size] for i in range(0, len(all_events), batch_size)]
+    if not batches:
+        return
+    # Overlap the per-batch round trips instead of waiting on each POST in turn
+    with ThreadPoolExecutor(max_workers=min(POST_WORKERS, len(batches))) as executor:
+        list(executor.map(send_batch, batches))
 
 # =========================
 # Main
@@ -2,12 +2,22 @@ import os
 import sys
 import json
 import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from google.oauth2 import service_account
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+# Resumable upload chunk size (must be a multiple of 256 KiB). Keeps at most one
+# chunk of the file in memory instead of the client's 100 MiB default
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Retries per chunk on transient (5xx / rate limit) errors; a retried chunk
+# resumes from the last acknowledged byte instead of restarting the upload
+UPLOAD_NUM_RETRIES = 3
+
 def _get_drive_service_and_folder():
     creds_json = os.getenv("GDRIVE_CREDENTIALS")
     folder_id = os.getenv("GDRIVE_FOLDER_ID_RICS")
@@ -20,20 +30,39 @@ def _get_drive_service_and_folder():
     if missing:
         raise RuntimeError(f"Missing env: {', '.join(missing)}")
 
+    return _get_drive_service(creds_json), folder_id
+
+# googleapiclient services wrap a non thread-safe httplib2 connection, so each
+# thread keeps its own (built once per thread, reused across its uploads)
+_thread_local = threading.local()
+
+@functools.lru_cache(maxsize=1)
+def _load_credentials(creds_json):
+    """Parse the service account once per credentials string."""
     try:
         info = json.loads(creds_json)
     except Exception as e:
         raise RuntimeError(f"GDRIVE_CREDENTIALS is not valid JSON: {e}")
 
     try:
-        creds = service_account.Credentials.from_service_account_info(
+        return service_account.Credentials.from_service_account_info(
             info, scopes=["https://www.googleapis.com/auth/drive"]
         )
-        service = build("drive", "v3", credentials=creds)
     except Exception as e:
         raise RuntimeError(f"Failed to initialize Google Drive service: {e}")
 
-    return service, folder_id
+def _get_drive_service(creds_json):
+    """Return this thread's Drive client, building it on first use."""
+    cached = getattr(_thread_local, "drive_service", None)
+    if cached is not None and cached[0] == creds_json:
+        return cached[1]
+    creds = _load_credentials(creds_json)
+    try:
+        service = build("drive", "v3", credentials=creds, cache_discovery=False)
+    except Exception as e:
+        raise RuntimeError(f"Failed to initialize Google Drive service: {e}")
+    _thread_local.drive_service = (creds_json, service)
+    return service
 
 def upload_to_drive(file_path, filename=None, folder_id=None):
     """
@@ -66,7 +95,7 @@ def upload_to_drive(file_path, filename=None, folder_id=None):
             supportsAllDrives=True
         ).execute().get("files", [])
 
-        media = MediaFileUpload(file_path, resumable=True)
+        media = MediaFileUpload(file_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
 
         if existing:
             file_id = existing[0]["id"]
@@ -75,7 +104,7 @@ def upload_to_drive(file_path, filename=None, folder_id=None):
                 fileId=file_id,
                 media_body=media,
                 supportsAllDrives=True
-            ).execute()
+            ).execute(num_retries=UPLOAD_NUM_RETRIES)
         else:
             logging.info(f"No existing {filename}. Creating new file in {folder_id}")
             metadata = {"name": filename, "parents": [folder_id]}
@@ -84,9 +113,23 @@ def upload_to_drive(file_path, filename=None, folder_id=None):
                 media_body=media,
                 fields="id",
                 supportsAllDrives=True
-            ).execute()
+            ).execute(num_retries=UPLOAD_NUM_RETRIES)
 
         logging.info(f"✅ Uploaded {filename} to Google Drive")
     except Exception as e:
         logging.error(f"Error uploading {filename}: {e}")
         raise
+
+def upload_files_to_drive(file_paths, folder_id=None, max_workers=4):
+    """
+    Upload several independent files to Google Drive concurrently.
+    Each worker thread uses its own Drive service. Raises the first upload
+    error after every upload has finished.
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+        futures = [executor.submit(upload_to_drive, path, folder_id=folder_id) for path in file_paths]
+    for future in futures:
+        future.result()
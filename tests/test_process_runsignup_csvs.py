@@ -0,0 +1,430 @@
+"""
+Tests for the RunSignup CSV processor helpers.
+"""
+
+import sys
+import os
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts import process_runsignup_csvs as rsu
+
+
+KEY_A = "a" * 64
+KEY_B = "0123456789abcdef" + "f" * 48
+
+
+# ---------- Event keys / processed events log ----------
+
+@pytest.fixture
+def event_logs(tmp_path, monkeypatch):
+    """Point the processed events logs at a temporary directory."""
+    txt_log = tmp_path / "processed_runsignup_events.txt"
+    json_log = tmp_path / "processed_runsignup_events.json"
+    monkeypatch.setattr(rsu, "PROCESSED_EVENTS_LOG", str(txt_log))
+    monkeypatch.setattr(rsu, "LEGACY_PROCESSED_EVENTS_LOG", str(json_log))
+    return txt_log, json_log
+
+
+def test_event_key_id_uses_64_bit_prefix():
+    """Keys sharing the first 16 hex chars map to the same id."""
+    assert rsu._event_key_id(KEY_B) == 0x0123456789ABCDEF
+    assert rsu._event_key_id(KEY_B[:16]) == rsu._event_key_id(KEY_B)
+    key = rsu._generate_event_key("a@b.com", {"event": "5K", "event_year": 2024, "bib": "7"}, None)
+    assert rsu._event_key_id(key) == int(key[:16], 16)
+
+
+@pytest.mark.parametrize("bad_key", ["abc", "z" * 64, ""])
+def test_event_key_id_rejects_malformed_keys(bad_key):
+    with pytest.raises(ValueError):
+        rsu._event_key_id(bad_key)
+
+
+def test_load_processed_events_reads_txt_log(event_logs):
+    txt_log, _ = event_logs
+    txt_log.write_text(f"{KEY_A}\n\n{KEY_B}\n")
+    assert rsu.load_processed_events() == {rsu._event_key_id(KEY_A), rsu._event_key_id(KEY_B)}
+
+
+def test_load_processed_events_skips_malformed_lines(event_logs, capsys):
+    """A truncated line from an interrupted append must not abort the sync."""
+    txt_log, _ = event_logs
+    txt_log.write_text(f"{KEY_A}\nnot-a-hex-key-at-all\n{KEY_B[:7]}")
+    assert rsu.load_processed_events() == {rsu._event_key_id(KEY_A)}
+    assert "Skipped 2 malformed" in capsys.readouterr().out
+
+
+def test_load_processed_events_missing_logs(event_logs):
+    assert rsu.load_processed_events() == set()
+
+
+@pytest.mark.parametrize("legacy_data", [
+    [KEY_A, KEY_B],
+    {"events": [KEY_A, KEY_B]},
+])
+def test_load_processed_events_falls_back_to_legacy_json(event_logs, legacy_data):
+    _, json_log = event_logs
+    json_log.write_text(json.dumps(legacy_data))
+    assert rsu.load_processed_events() == {rsu._event_key_id(KEY_A), rsu._event_key_id(KEY_B)}
+
+
+def test_legacy_json_ignored_once_txt_log_exists(event_logs):
+    txt_log, json_log = event_logs
+    json_log.write_text(json.dumps([KEY_A]))
+    txt_log.write_text(f"{KEY_B}\n")
+    assert rsu.load_processed_events() == {rsu._event_key_id(KEY_B)}
+
+
+def test_append_processed_events_carries_over_legacy_keys(event_logs):
+    txt_log, json_log = event_logs
+    json_log.write_text(json.dumps({"events": [KEY_A]}))
+    rsu.append_processed_events({KEY_B})
+    assert set(txt_log.read_text().split()) == {KEY_A, KEY_B}
+
+    # Later appends only write the new keys
+    key_c = "c" * 64
+    rsu.append_processed_events({key_c})
+    assert txt_log.read_text().split().count(KEY_A) == 1
+    assert rsu.load_processed_events() == {rsu._event_key_id(k) for k in (KEY_A, KEY_B, key_c)}
+
+
+# ---------- Timestamp parsing ----------
+
+@pytest.mark.parametrize("raw, expected", [
+    ("2024-05-01 10:11:12", "2024-05-01T10:11:12+00:00"),
+    ("2024-05-01 10:11:12.123456", "2024-05-01T10:11:12.123456+00:00"),
+    ("2024-05-01T10:11:12", "2024-05-01T10:11:12+00:00"),
+    ("2024-05-01T10:11:12.5", "2024-05-01T10:11:12.500000+00:00"),
+    ("  2024-05-01 10:11:12 ", "2024-05-01T10:11:12+00:00"),
+    ("05/01/2024 10:11:12", "2024-05-01T10:11:12+00:00"),
+])
+def test_timestamp_parser_known_formats(raw, expected):
+    assert rsu._make_timestamp_parser()(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [None, "", "   "])
+def test_timestamp_parser_blank(raw):
+    assert rsu._make_timestamp_parser()(raw) is None
+
+
+@pytest.mark.parametrize("raw", [
+    "2024-05-01",  # date only
+    "2024-05-01T10:11:12+00:00",  # UTC offset
+    "2024-05-01T10:11:12Z",  # trailing Z (fromisoformat accepts it on 3.11+)
+    "not a date",
+])
+def test_timestamp_parser_unsupported_shapes_fall_back_to_now(raw):
+    """Shapes outside TIMESTAMP_FORMATS use the current time on every Python version."""
+    before = datetime.now(timezone.utc)
+    parsed = datetime.fromisoformat(rsu._make_timestamp_parser()(raw))
+    assert parsed >= before
+
+
+def test_timestamp_parser_mixed_formats_in_one_file():
+    """The move-to-front hint never changes results when formats alternate."""
+    parse = rsu._make_timestamp_parser()
+    assert parse("05/01/2024 10:11:12") == "2024-05-01T10:11:12+00:00"
+    assert parse("2024-05-02 10:11:12.25") == "2024-05-02T10:11:12.250000+00:00"
+    assert parse("05/03/2024 10:11:12") == "2024-05-03T10:11:12+00:00"
+
+
+# ---------- Row mapping ----------
+
+HEADER = ["First Name", "Last Name", "email address", " Event ", "Event Year",
+          "Registration Date", "Bib", "Gender", "Age", "Race"]
+
+
+def test_row_mapper_maps_headers_case_insensitively():
+    map_row = rsu._build_row_mapper(HEADER)
+    profile, event, ts, email = map_row(
+        ["Ann", "Lee", " Ann@Example.COM ", "City 5K", "2024", "2024-05-01 10:11:12", "42", "F", "37", "5K"]
+    )
+    assert email == "ann@example.com"
+    assert profile == {"first_name": "Ann", "last_name": "Lee", "rsu_event": "City 5K", "rsu_event_year": "2024"}
+    assert event == {"event": "City 5K", "event_year": 2024, "bib": "42", "gender": "F", "age": 37, "race": "5K"}
+    assert ts == "2024-05-01T10:11:12+00:00"
+
+
+
+
+def test_row_mapper_falls_back_to_underscored_header_names():
+    """Headers outside HEADER_MAP that already name a canonical key still resolve."""
+    map_row = rsu._build_row_mapper(["Email", "First Name", "Event Name", "event_year"])
+    profile, event, _, email = map_row(["A@B.com", "Ann", "City 5K", "2024"])
+    assert email == "a@b.com"
+    assert profile == {"first_name": "Ann", "rsu_event": "City 5K", "rsu_event_year": "2024"}
+    assert event == {"event": "City 5K", "event_year": 2024}
+
+    assert rsu._build_row_mapper(["email"])(["a@b.com"])[3] == "a@b.com"
+
+
+def test_row_mapper_skips_null_and_non_numeric_values():
+    map_row = rsu._build_row_mapper(HEADER)
+    profile, event, _, _ = map_row(["", "", "a@b.com", "NULL", "n/a", "", "NULL", "NULL", "x", "NULL"])
+    assert profile == {"rsu_event": "NULL", "rsu_event_year": "n/a"}
+    assert event == {}
+
+
+def test_row_mapper_pads_short_rows():
+    map_row = rsu._build_row_mapper(HEADER)
+    profile, event, ts, email = map_row(["Ann", "Lee", "a@b.com"])
+    assert email == "a@b.com"
+    assert profile == {"first_name": "Ann", "last_name": "Lee"}
+    assert event == {}
+    assert ts is None
+
+
+@pytest.mark.parametrize("raw_email", ["", "nope", "@b.com", "a@b"])
+def test_row_mapper_rejects_invalid_email(raw_email):
+    map_row = rsu._build_row_mapper(HEADER)
+    assert map_row(["Ann", "Lee", raw_email]) == (None, None, None, None)
+
+
+def test_row_mapper_missing_columns():
+    map_row = rsu._build_row_mapper(["Email Address", "Unknown Column"])
+    profile, event, ts, email = map_row(["a@b.com", "ignored"])
+    assert (profile, event, ts, email) == ({}, {}, None, "a@b.com")
+    # No header at all: no email column, so every row is invalid
+    assert rsu._build_row_mapper(None)(["a@b.com"]) == (None, None, None, None)
+
+
+# ---------- Drive listing cache ----------
+
+class _FakeRequest:
+    def __init__(self, result):
+        self._result = result
+
+    def execute(self):
+        return self._result
+
+
+class _FakeFiles:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, **kwargs):
+        self._drive.list_calls.append(kwargs)
+        files = sorted(self._drive.stored, key=lambda f: f["modifiedTime"], reverse=True)
+        if "orderBy" in kwargs:
+            files = files[:kwargs["pageSize"]]
+        return _FakeRequest({"files": [dict(f) for f in files]})
+
+
+class _FakeDrive:
+    """Minimal stand-in for the Drive v3 service used by drive_list_csvs."""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.list_calls = []
+
+    def files(self):
+        return _FakeFiles(self)
+
+    def full_listings(self):
+        return [c for c in self.list_calls if "orderBy" not in c]
+
+
+def _file(file_id, modified, name=None):
+    return {"id": file_id, "name": name or f"runsignup_export_{file_id}.csv", "modifiedTime": modified}
+
+
+@pytest.fixture
+def drive():
+    return _FakeDrive([
+        _file("f1", "2024-05-01T00:00:00Z"),
+        _file("n1", "2024-04-01T00:00:00Z", name="notes.txt"),
+    ])
+
+
+def test_drive_list_csvs_without_manifest_always_lists(drive):
+    files, from_cache = rsu.drive_list_csvs(drive, "folder")
+    assert [f["id"] for f in files] == ["f1"]
+    assert from_cache is False
+    assert drive.full_listings() == drive.list_calls
+
+
+def test_drive_list_csvs_reuses_listing_while_newest_file_unchanged(drive):
+    manifest = {}
+    files, from_cache = rsu.drive_list_csvs(drive, "folder", manifest)
+    assert from_cache is False
+    assert manifest["folder"]["newest"] == {"id": "f1", "modifiedTime": "2024-05-01T00:00:00Z"}
+
+    drive.list_calls.clear()
+    files, from_cache = rsu.drive_list_csvs(drive, "folder", manifest)
+    assert from_cache is True
+    assert [f["id"] for f in files] == ["f1"]
+    assert drive.full_listings() == []  # Only the one-result probe was made
+
+
+@pytest.mark.parametrize("change", ["new_file", "edited_file"])
+def test_drive_list_csvs_relists_when_newest_file_changes(drive, change):
+    manifest = {}
+    rsu.drive_list_csvs(drive, "folder", manifest)
+    if change == "new_file":
+        drive.stored.append(_file("f2", "2024-06-01T00:00:00Z"))
+    else:
+        drive.stored[0] = _file("f1", "2024-06-01T00:00:00Z")
+
+    files, from_cache = rsu.drive_list_csvs(drive, "folder", manifest)
+    assert from_cache is False
+    assert max(f["modifiedTime"] for f in files) == "2024-06-01T00:00:00Z"
+    assert manifest["folder"]["newest"]["modifiedTime"] == "2024-06-01T00:00:00Z"
+
+
+def test_drive_list_csvs_refresh_bypasses_cache(drive):
+    manifest = {}
+    rsu.drive_list_csvs(drive, "folder", manifest)
+    drive.list_calls.clear()
+    files, from_cache = rsu.drive_list_csvs(drive, "folder", manifest, refresh=True)
+    assert from_cache is False
+    assert len(drive.full_listings()) == 1
+
+
+def test_drive_manifest_ignores_legacy_folder_modified_entries(drive):
+    """Entries keyed on the folder's own modifiedTime are never trusted."""
+    manifest = {"folder": {"modifiedTime": "2024-01-01T00:00:00Z", "files": []}}
+    files, from_cache = rsu.drive_list_csvs(drive, "folder", manifest)
+    assert from_cache is False
+    assert [f["id"] for f in files] == ["f1"]
+
+
+def test_drive_manifest_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(rsu, "DRIVE_MANIFEST_LOG", str(tmp_path / "logs" / "manifest.json"))
+    monkeypatch.setattr(rsu, "DRIVE_LIST_CACHE", True)
+    manifest = {"folder": {"newest": {"id": "f1", "modifiedTime": "t"}, "files": []}}
+    rsu.save_drive_manifest(manifest)
+    assert rsu.load_drive_manifest() == manifest
+
+    monkeypatch.setattr(rsu, "DRIVE_LIST_CACHE", False)
+    assert rsu.load_drive_manifest() == {}
+
+
+# ---------- Synced-file cursors ----------
+
+@pytest.mark.parametrize("cursor, expected", [
+    ({"id": "f1", "modifiedTime": "t1"}, True),
+    ({"id": "f1", "modifiedTime": "t0"}, False),
+    ({"id": "f2", "modifiedTime": "t1"}, False),
+    ({}, False),
+    (None, False),
+])
+def test_is_synced(cursor, expected):
+    assert rsu._is_synced(cursor, {"id": "f1", "modifiedTime": "t1", "name": "a.csv"}) is expected
+
+
+CSV_BYTES = b"Email Address,Event\na@b.com,5K\nc@d.com,5K\n"
+
+
+@pytest.fixture
+def sync_run(tmp_path, monkeypatch, event_logs, drive):
+    """Run process_runsignup_csvs against a fake Drive folder (no network)."""
+    for key in [k for k in os.environ if k.startswith((rsu.FOLDER_ENV_PREFIX, rsu.LIST_ENV_PREFIX))]:
+        monkeypatch.delenv(key)
+    monkeypatch.setenv("OPTIMIZELY_API_TOKEN", "token")
+    monkeypatch.setenv("GDRIVE_CREDENTIALS", "{}")
+    monkeypatch.setenv("RSU_FOLDER_IDS", "1384")
+    monkeypatch.setenv("GDRIVE_FOLDER_ID_1384", "folder")
+    monkeypatch.setenv("OPTIMIZELY_LIST_ID_1384", "list")
+    monkeypatch.setattr(rsu, "DRY_RUN", True)
+    monkeypatch.setattr(rsu, "RSU_TEST_MODE", False)
+    monkeypatch.setattr(rsu, "RSU_RESYNC_FILES", False)
+    monkeypatch.setattr(rsu, "DRIVE_LIST_CACHE", True)
+    monkeypatch.setattr(rsu, "DRIVE_MANIFEST_LOG", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(rsu, "SYNCED_FILES_LOG", str(tmp_path / "synced.json"))
+    monkeypatch.setattr(rsu, "_get_drive_service", lambda: drive)
+    monkeypatch.setattr(rsu, "post_events_batch", lambda batch: (202, "ok"))
+
+    downloaded = []
+    contents = {}
+
+    def fake_download(file_id):
+        downloaded.append(file_id)
+        return io.BytesIO(contents.get(file_id, CSV_BYTES))
+
+    monkeypatch.setattr(rsu, "_download_csv", fake_download)
+
+    def run(cursor=None, manifest=None, live=False, files=None):
+        """Run once; returns (rows_processed, downloaded file ids)."""
+        monkeypatch.setattr(rsu, "DRY_RUN", not live)
+        contents.clear()
+        contents.update(files or {})
+        if cursor is not None:
+            rsu.save_synced_files({"folder": cursor})
+        if manifest is not None:
+            rsu.save_drive_manifest(manifest)
+        downloaded.clear()
+        rows = rsu.process_runsignup_csvs()
+        return rows, list(downloaded)
+
+    return run
+
+
+def test_folder_processed_without_cursor(sync_run):
+    assert sync_run() == (2, ["f1"])
+
+
+def test_folder_skipped_when_cursor_matches_newest_file(sync_run):
+    assert sync_run(cursor={"id": "f1", "modifiedTime": "2024-05-01T00:00:00Z"}) == (0, [])
+
+
+def test_folder_processed_when_newest_file_changed_since_cursor(sync_run):
+    assert sync_run(cursor={"id": "f1", "modifiedTime": "2024-04-01T00:00:00Z"}) == (2, ["f1"])
+
+
+def test_stale_cached_listing_is_not_trusted_for_cursor_skip(sync_run, drive):
+    """A cached listing that matches the cursor is re-checked against a fresh listing."""
+    drive.stored.append(_file("f2", "2024-06-01T00:00:00Z"))
+    stale_manifest = {"folder": {
+        "newest": {"id": "f2", "modifiedTime": "2024-06-01T00:00:00Z"},
+        "files": [_file("f1", "2024-05-01T00:00:00Z")],
+    }}
+    cursor = {"id": "f1", "modifiedTime": "2024-05-01T00:00:00Z"}
+    assert sync_run(cursor=cursor, manifest=stale_manifest) == (2, ["f2"])
+
+
+def test_live_run_records_cursor_and_skips_next_run(sync_run):
+    assert sync_run(live=True) == (2, ["f1"])
+    assert rsu.load_synced_files() == {"folder": {"id": "f1", "modifiedTime": "2024-05-01T00:00:00Z"}}
+    assert sync_run(live=True) == (0, [])
+
+
+def test_cursor_not_advanced_after_row_errors(sync_run, monkeypatch):
+    """Rows that raise before being queued are retried next run instead of dropped."""
+    generate_event_key = rsu._generate_event_key
+
+    def failing_event_key(email, event_props, registration_ts):
+        if email == "c@d.com":
+            raise ValueError("boom")
+        return generate_event_key(email, event_props, registration_ts)
+
+    monkeypatch.setattr(rsu, "_generate_event_key", failing_event_key)
+    sync_run(live=True)
+    assert rsu.load_synced_files() == {}
+
+    # The folder is picked up again on the next run
+    monkeypatch.setattr(rsu, "_generate_event_key", generate_event_key)
+    assert sync_run(live=True)[1] == ["f1"]
+    assert "folder" in rsu.load_synced_files()
+
+
+def test_decode_error_mid_file_skips_rest_of_file(sync_run, event_logs):
+    """A bad UTF-8 byte past the first read chunk only skips the rest of that file."""
+    txt_log, _ = event_logs
+    good_rows = b"".join(b"u%d@b.com,5K\n" % i for i in range(2000))
+    rows, downloaded = sync_run(live=True, files={"f1": b"Email Address,Event\n" + good_rows + b"\xff\xfe,5K\n"})
+    assert downloaded == ["f1"]
+    assert 0 < rows < 2000  # Rows decoded before the bad chunk were still processed
+    # Their event keys reached the dedup log, but the file is not marked as synced
+    assert len(txt_log.read_text().split()) == rows
+    assert rsu.load_synced_files() == {}
+
+
+def test_decode_error_in_header_skips_file(sync_run):
+    assert sync_run(live=True, files={"f1": b"\xff\xfeEmail Address\na@b.com\n"}) == (0, ["f1"])
+    assert rsu.load_synced_files() == {}
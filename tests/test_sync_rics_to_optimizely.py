@@ -0,0 +1,98 @@
+"""
+Tests for the RICS purchase event post pool.
+"""
+
+import sys
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rics_connector import sync_rics_to_optimizely as rics
+
+
+BATCH = [{"type": "purchase"}, {"type": "purchase"}]
+KEYS = ["k1", "k2"]
+
+
+@pytest.mark.parametrize("status_code", [200, 202])
+def test_post_event_batch_returns_keys_for_accepted_batch(monkeypatch, status_code):
+    monkeypatch.setattr(rics, "post_events_batch", lambda batch: (status_code, "ok"))
+    assert rics._post_event_batch(BATCH, KEYS, "", False) == (2, KEYS)
+
+
+@pytest.mark.parametrize("status_code", [400, 429, 500])
+def test_post_event_batch_returns_no_keys_for_failed_batch(monkeypatch, status_code):
+    monkeypatch.setattr(rics, "post_events_batch", lambda batch: (status_code, "error"))
+    assert rics._post_event_batch(BATCH, KEYS, "", False) == (0, [])
+
+
+def test_post_event_batch_returns_no_keys_when_post_raises(monkeypatch):
+    def raise_error(batch):
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(rics, "post_events_batch", raise_error)
+    assert rics._post_event_batch(BATCH, KEYS, "final ", True) == (0, [])
+
+
+class _RecordingFuture(Future):
+    """Future that records the order in which results are collected."""
+
+    def __init__(self, name, result, collected):
+        super().__init__()
+        self.name = name
+        self._collected = collected
+        self.set_result(result)
+
+    def result(self, timeout=None):
+        self._collected.append(self.name)
+        return super().result(timeout)
+
+
+def test_wait_for_posts_drains_oldest_first_to_max_pending():
+    collected = []
+    pending = [
+        _RecordingFuture("first", (2, ["a", "b"]), collected),
+        _RecordingFuture("failed", (0, []), collected),
+        _RecordingFuture("third", (1, ["c"]), collected),
+        _RecordingFuture("newest", (1, ["d"]), collected),
+    ]
+    new_event_keys = set()
+
+    assert rics._wait_for_posts(pending, new_event_keys, max_pending=1) == 3
+    assert collected == ["first", "failed", "third"]
+    assert [f.name for f in pending] == ["newest"]
+    assert new_event_keys == {"a", "b", "c"}
+
+    # Default max_pending drains everything
+    assert rics._wait_for_posts(pending, new_event_keys) == 1
+    assert pending == []
+    assert new_event_keys == {"a", "b", "c", "d"}
+
+
+def test_wait_for_posts_noop_within_max_pending():
+    pending = [_RecordingFuture("only", (2, KEYS), [])]
+    new_event_keys = set()
+    assert rics._wait_for_posts(pending, new_event_keys, max_pending=1) == 0
+    assert len(pending) == 1
+    assert new_event_keys == set()
+
+
+def test_post_pool_only_marks_accepted_batches(monkeypatch):
+    """End to end through the executor: only keys of accepted batches are collected."""
+    def fake_post(batch):
+        return (500, "error") if batch[0]["fail"] else (202, "ok")
+
+    monkeypatch.setattr(rics, "post_events_batch", fake_post)
+    new_event_keys = set()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pending = [
+            executor.submit(rics._post_event_batch, [{"fail": False}], ["ok1"], "", False),
+            executor.submit(rics._post_event_batch, [{"fail": True}], ["bad"], "", False),
+            executor.submit(rics._post_event_batch, [{"fail": False}], ["ok2"], "final ", False),
+        ]
+        assert rics._wait_for_posts(pending, new_event_keys) == 2
+    assert new_event_keys == {"ok1", "ok2"}